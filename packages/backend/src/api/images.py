@@ -1,23 +1,64 @@
-from fastapi import APIRouter, HTTPException, Query, Request, Header, Response
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, JSONResponse
 from pydantic import BaseModel
 import mimetypes
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 import anyio  # type: ignore[import-not-found]
 import os
-from urllib.parse import quote
+from pathlib import Path
 
 import sqlalchemy as sa
 
+from ..core.config import settings
 from ..database.db import async_conn, async_tx
 from ..database import schema as t
-from ..services.storage_fs import thumb_path, delete_thumb
+from ..services.storage_fs import delete_thumb, stat_file, thumb_stat
 from ..services import gen_metadata, image_tags, image_feed
 from ..services.image_feed import FeedFilter, FeedFilterError
 from ..services.image_tags import find_image as _find_image_doc  # type: ignore
+from ._utils import quote_id
 
 
 router = APIRouter()
 
+# Media routes share one bounded lane on the worker pool: a grid scroll fires
+# dozens of thumb/file stats at once, and without a cap they can take every
+# default thread token and starve the other to_thread work (purge, deletes).
+_MEDIA_LIMITER = anyio.CapacityLimiter(32)
+
+# Static media headers, built once. Starlette copies them into raw headers per
+# response, so sharing the dicts is safe.
+_IMMUTABLE = {"Cache-Control": "public, max-age=31536000, immutable"}
+_FILE_HEADERS = {**_IMMUTABLE, "Accept-Ranges": "bytes"}
+
+# Media types for the extensions the scanner indexes (``scanner.IMAGE_EXTS``):
+# one dict probe per file request. ``mimetypes`` only sees anything else.
+_EXT_MEDIA_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+    ".bmp": "image/bmp",
+    ".avif": "image/avif",
+}
+
+# Deepest legacy ``offset`` page served. SQLite walks and discards every skipped
+# row, so a deep offset costs O(offset); past this, clients must page by cursor.
+_MAX_OFFSET = 1000
+
+
+class _MediaResponse(FileResponse):
+    """FileResponse with a per-response read size (``settings.media_chunk_*``).
+
+    Range reads are still clamped to the remaining length by Starlette.
+    """
+
+    def __init__(self, *args, chunk_size: int, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.chunk_size = max(1, chunk_size)
+
 
 class RatingPatch(BaseModel):
     rating: str
@@ -35,15 +76,113 @@ class PurgeBody(BaseModel):
     confirm: bool = False
 
 
+# The media routes' DB lookup and stat run together in one worker-thread hop on
+# the sync engine. Going through aiosqlite first costs its own thread round trip
+# per query, and under a grid burst that doubled-up dispatch dominated.
+def _locate_file(
+    image_id: str,
+) -> tuple[dict | None, str | None, os.stat_result | None]:
+    """``(image, path, stat)`` for the original; later parts None when missing."""
+    img = image_tags.find_image_sync(image_id, {"path": 1})
+    path = img.get("path") if img else None
+    return img, path, stat_file(path) if path else None
+
+
+def _locate_thumb(
+    image_id: str,
+) -> tuple[dict | None, str | None, tuple[Path, os.stat_result] | None]:
+    """``(image, thumb_key, (path, stat))`` for the thumbnail, likewise."""
+    img = image_tags.find_image_sync(image_id, {"thumb_key": 1})
+    key = img.get("thumb_key") if img else None
+    return img, key, thumb_stat(key) if key else None
+
+
+def _not_modified(request: Request, resp: FileResponse) -> bool:
+    """True when the client's cached copy still matches ``resp``'s validators.
+
+    ``If-None-Match`` wins over ``If-Modified-Since`` (RFC 9110 §13.2.2); the
+    ETag is the one FileResponse already derived from the stat.
+    """
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        if inm.strip() == "*":
+            return True
+        etag = resp.headers["etag"]
+        return any(v.strip().removeprefix("W/") == etag for v in inm.split(","))
+    ims = request.headers.get("if-modified-since")
+    if ims is None:
+        return False
+    try:
+        since = _http_date(ims)
+        modified = _http_date(resp.headers["last-modified"])
+    except (TypeError, ValueError):
+        return False
+    return modified <= since
+
+
+def _http_date(value: str) -> datetime:
+    """Parse an HTTP date as an aware UTC datetime. asctime dates and a
+    ``-0000`` zone parse naive; HTTP dates are always UTC, so pin them there
+    rather than let an aware/naive comparison raise."""
+    parsed = parsedate_to_datetime(value)
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+# Validators a 304 repeats (RFC 9110 §15.4.5); no body, so no length or type.
+_NOT_MODIFIED_KEEP = frozenset((b"etag", b"last-modified", b"cache-control"))
+
+
+def _conditional(request: Request, resp: FileResponse) -> Response:
+    """Turn a revalidation hit into a bodiless 304 instead of streaming.
+
+    The 304 lifts the FileResponse's already-encoded header pairs rather than
+    rebuilding a dict and re-encoding it: a grid revalidation burst is mostly
+    these, so they stay a few list ops.
+    """
+    if not _not_modified(request, resp):
+        return resp
+    not_modified = Response(status_code=304)
+    not_modified.raw_headers = [
+        (k, v) for k, v in resp.raw_headers if k in _NOT_MODIFIED_KEEP
+    ]
+    return not_modified
+
+
+def _check_paging(cursor: str | None, offset: int) -> None:
+    """Reject pagination input the feed queries shouldn't run."""
+    if cursor and len(cursor) > 1024:
+        raise HTTPException(status_code=422, detail="cursor too long")
+    if not cursor and offset > _MAX_OFFSET:
+        raise HTTPException(
+            status_code=422,
+            detail=f"offset > {_MAX_OFFSET} is not supported; page with cursor "
+            "(the X-Next-Cursor header of the previous page)",
+        )
+
+
+def _next_cursor(items: list[dict], limit: int) -> dict[str, str]:
+    """``X-Next-Cursor`` for a full page: the last ``_id``, ready to pass back."""
+    if len(items) < limit:
+        return {}
+    return {"X-Next-Cursor": items[-1]["_id"]}
+
+
 def _attach_thumb_url(it: dict) -> None:
-    """Replace the row's thumb_key with the streaming thumb route."""
-    it.pop("thumb_key", None)
-    it["thumb_url"] = f"/api/images/{quote(it['_id'], safe='')}/thumb"
+    """Add the streaming thumb route, versioned by the row's ``mtime``.
+
+    The route is served ``immutable``, but a rescan rewrites a changed file's
+    thumb under the same key; the ``?v=`` bump turns that into a new URL instead
+    of a stale browser cache. ``mtime`` is consumed, not returned.
+    """
+    url = f"/api/images/{quote_id(it['_id'])}/thumb"
+    mtime = it.pop("mtime", None)
+    it["thumb_url"] = f"{url}?v={int(mtime)}" if mtime is not None else url
 
 
 @router.get("")
 async def list_images(
-    response: Response,
     tags: list[str] | None = Query(default=None),
     logic: str = Query(default="and"),
     library_id: str | None = Query(default=None),
@@ -63,8 +202,7 @@ async def list_images(
     group_id: str | None = Query(default=None),
     cursor: str | None = Query(default=None),
 ):
-    if cursor and len(cursor) > 1024:
-        raise HTTPException(status_code=422, detail="cursor too long")
+    _check_paging(cursor, offset)
 
     try:
         f = FeedFilter(
@@ -87,105 +225,79 @@ async def list_images(
     except FeedFilterError as exc:
         raise HTTPException(status_code=422, detail=str(exc))
 
+    items = await image_feed.list_feed(f, cursor=cursor, limit=limit, offset=offset)
+    headers = _next_cursor(items, limit)
     if not cursor and offset:
-        response.headers["X-Tagify-Warn"] = (
+        headers["X-Tagify-Warn"] = (
             "offset pagination is deprecated; prefer cursor-based pagination"
         )
-
-    items = await image_feed.list_feed(f, cursor=cursor, limit=limit, offset=offset)
     for it in items:
         _attach_thumb_url(it)
-    return items
+    # Feed rows are flat str/number/None dicts: render them straight to bytes
+    # rather than letting FastAPI deep-copy up to 1000 of them through
+    # jsonable_encoder first.
+    return JSONResponse(items, headers=headers)
 
 
-@router.get("/{image_id:path}/file")
+@router.api_route("/{image_id:path}/file", methods=["GET", "HEAD"])
 async def get_image_file(
     image_id: str,
     request: Request,
-    range: str | None = Header(default=None, alias="Range"),
 ):
-    """Serve the original image file directly from the local filesystem."""
-    img = await _find_image_doc(image_id, {"path": 1})
-    if not img:
-        raise HTTPException(status_code=404, detail="Image not found")
-    path = img.get("path")
-    if not path:
-        raise HTTPException(status_code=404, detail="File path not available")
+    """Serve the original image file directly from the local filesystem.
 
-    # Verify the file still exists on disk
-    if not await anyio.to_thread.run_sync(lambda: os.path.isfile(path)):  # type: ignore[attr-defined]
-        raise HTTPException(status_code=404, detail="Original file not found on disk")
-
-    media_type, _ = mimetypes.guess_type(path)
-    # FileResponse handles Range headers, ETag, Content-Length natively
-    return FileResponse(
-        path,
-        media_type=media_type or "application/octet-stream",
-        headers={
-            "Cache-Control": "public, max-age=31536000, immutable",
-            "Accept-Ranges": "bytes",
-        },
+    HEAD takes the same path: FileResponse sends headers only, so a HEAD (or a
+    HEAD + ``If-Range`` probe) sees exactly the ETag / Last-Modified / length /
+    206 Content-Range a GET would, from the one stat, without opening the file.
+    """
+    img, path, st = await anyio.to_thread.run_sync(  # type: ignore[attr-defined]
+        _locate_file, image_id, limiter=_MEDIA_LIMITER
     )
-
-
-@router.head("/{image_id:path}/file")
-async def head_image_file(image_id: str):
-    """HEAD for the original image file — stat from the local filesystem."""
-    img = await _find_image_doc(image_id, {"path": 1})
     if not img:
         raise HTTPException(status_code=404, detail="Image not found")
-    path = img.get("path")
     if not path:
         raise HTTPException(status_code=404, detail="File path not available")
-
-    if not await anyio.to_thread.run_sync(lambda: os.path.isfile(path)):  # type: ignore[attr-defined]
+    if st is None:
         raise HTTPException(status_code=404, detail="Original file not found on disk")
 
-    media_type, _ = mimetypes.guess_type(path)
-    st = await anyio.to_thread.run_sync(lambda: os.stat(path))  # type: ignore[attr-defined]
-    headers: dict[str, str] = {
-        "Accept-Ranges": "bytes",
-        "Content-Length": str(st.st_size),
-    }
-    return Response(
-        status_code=200,
-        headers=headers,
+    media_type = _EXT_MEDIA_TYPES.get(os.path.splitext(path)[1].lower())
+    if media_type is None:
+        media_type, _ = mimetypes.guess_type(path)
+    # FileResponse parses Range (incl. multi-range) and sets ETag/Content-Length.
+    resp = _MediaResponse(
+        path,
         media_type=media_type or "application/octet-stream",
+        headers=_FILE_HEADERS,
+        stat_result=st,
+        chunk_size=settings.media_chunk_original,
     )
+    return _conditional(request, resp)
 
 
-@router.get("/{image_id:path}/thumb")
-async def get_image_thumb(image_id: str):
-    img = await _find_image_doc(image_id, {"thumb_key": 1})
+@router.api_route("/{image_id:path}/thumb", methods=["GET", "HEAD"])
+async def get_image_thumb(image_id: str, request: Request):
+    img, thumb_key, found = await anyio.to_thread.run_sync(  # type: ignore[attr-defined]
+        _locate_thumb, image_id, limiter=_MEDIA_LIMITER
+    )
     if not img:
         raise HTTPException(status_code=404, detail="Image not found")
-    thumb_key = img.get("thumb_key")
     if not thumb_key:
         raise HTTPException(status_code=404, detail="Thumbnail not available")
+    if found is None:
+        raise HTTPException(status_code=404, detail="Thumbnail not found on disk")
+    path, st = found
 
     # Determine media type from the key extension
     media_type = "image/webp" if thumb_key.endswith(".webp") else "image/jpeg"
-
-    path = await anyio.to_thread.run_sync(lambda: thumb_path(thumb_key))  # type: ignore[attr-defined]
-    if path is None:
-        raise HTTPException(status_code=404, detail="Thumbnail not found on disk")
     # FileResponse handles ETag/Content-Length/sendfile natively.
-    return FileResponse(
+    resp = _MediaResponse(
         path,
         media_type=media_type,
-        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+        headers=_IMMUTABLE,
+        stat_result=st,
+        chunk_size=settings.media_chunk_thumb,
     )
-
-
-@router.head("/{image_id:path}/thumb")
-async def head_image_thumb(image_id: str):
-    img = await _find_image_doc(image_id, {"thumb_key": 1})
-    if not img:
-        raise HTTPException(status_code=404, detail="Image not found")
-    thumb_key = img.get("thumb_key", "") or ""
-    media_type = "image/webp" if thumb_key.endswith(".webp") else "image/jpeg"
-    headers = {"Accept-Ranges": "bytes"}
-    return Response(status_code=200, headers=headers, media_type=media_type)
+    return _conditional(request, resp)
 
 
 @router.get("/models")
@@ -223,11 +335,15 @@ async def list_groups(
     max_w: int | None = Query(default=None, ge=0),
     min_h: int | None = Query(default=None, ge=0),
     max_h: int | None = Query(default=None, ge=0),
+    cursor: str | None = Query(default=None),
 ):
     """Batch-collapsed view of the same feed: images sharing a gen_group_id fold
     into one entry (the newest member is the representative, plus a count).
     Prompt-less / ungrouped images stand alone. Grouping spans page boundaries
-    because it's a full aggregation, not a paged-then-grouped pass."""
+    because it's a full aggregation, not a paged-then-grouped pass. Cursor-paged
+    on the representative's ``_id``, like the feed."""
+    _check_paging(cursor, offset)
+
     try:
         f = FeedFilter(
             tags=tags,
@@ -248,10 +364,11 @@ async def list_groups(
     except FeedFilterError as exc:
         raise HTTPException(status_code=422, detail=str(exc))
 
-    out = await image_feed.list_groups(f, offset=offset, limit=limit)
+    out = await image_feed.list_groups(f, cursor=cursor, offset=offset, limit=limit)
+    headers = _next_cursor(out, limit)
     for it in out:
         _attach_thumb_url(it)
-    return out
+    return JSONResponse(out, headers=headers)
 
 
 @router.get("/{image_id:path}/workflow")
@@ -261,19 +378,7 @@ async def get_image_workflow(image_id: str):
     Format-aware: ComfyUI returns the `workflow` (UI graph, drops onto canvas)
     plus the `prompt` (API graph); A1111 returns the `parameters` string.
     """
-    async with async_conn() as conn:
-        raw = None
-        for candidate in image_tags.id_candidates(image_id):
-            row = (
-                await conn.execute(
-                    sa.select(t.image_gen_raw.c.raw).where(
-                        t.image_gen_raw.c._id == candidate
-                    )
-                )
-            ).first()
-            if row is not None:
-                raw = row.raw
-                break
+    raw = await image_tags.find_gen_raw(image_id)
     if not raw:
         raise HTTPException(status_code=404, detail="No generation data for image")
 
@@ -294,11 +399,19 @@ async def get_image_workflow(image_id: str):
 
 
 @router.get("/{image_id:path}")
-async def get_image(image_id: str):
-    img = await _find_image_doc(image_id)
+async def get_image(image_id: str, include: list[str] | None = Query(default=None)):
+    """The image document. ``ai`` omits its per-tag score lists unless
+    ``?include=ai`` asks for them."""
+    extra = set(include or ())
+    if not extra <= image_tags.DETAIL_INCLUDES:
+        raise HTTPException(
+            status_code=422,
+            detail=f"include must be among {sorted(image_tags.DETAIL_INCLUDES)}",
+        )
+    img = await image_tags.find_image_detail(image_id, include=extra)
     if not img:
         raise HTTPException(status_code=404, detail="Image not found")
-    return img
+    return JSONResponse(img)
 
 
 @router.post("/{image_id:path}/rating")
@@ -366,6 +479,7 @@ async def purge_image(image_id: str, body: PurgeBody):
         await conn.execute(
             sa.delete(t.image_gen_raw).where(t.image_gen_raw.c._id == rid)
         )
+        await image_tags.bump_tags_version(conn)
 
     thumb_key = img.get("thumb_key")
     if thumb_key:
@@ -1,6 +1,7 @@
 import uuid
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse
 import anyio  # type: ignore[import-not-found]
 
 import sqlalchemy as sa
@@ -9,6 +10,8 @@ from ..database.db import async_conn, async_tx
 from ..database import schema as t
 from ..models.library import LibraryIn, LibraryUpdate
 from ..services.scanner import cancel_scan, scan_library_async
+from ..services import image_tags
+from ..services.reproject import reproject_library_async
 
 from ..services.storage_fs import delete_by_prefix
 
@@ -30,10 +33,38 @@ _LIB_LIST_COLS = (
 
 
 @router.get("")
-async def list_libraries():
+async def list_libraries(
+    limit: int | None = Query(default=None, ge=1, le=1000),
+    cursor: str | None = Query(default=None),
+):
+    """Libraries in creation (rowid) order.
+
+    Without ``limit`` the whole list comes back, as the sidebar, filters and AI
+    page expect. With it, pages are bounded: a full page carries
+    ``X-Next-Cursor`` (its last ``_id``), and passing that back as ``cursor``
+    resumes after that row's rowid. An unknown cursor is a 422, not an empty
+    page that would read as the end of the list.
+    """
+    if cursor and len(cursor) > 1024:
+        raise HTTPException(status_code=422, detail="cursor too long")
+    rowid = sa.literal_column("libraries.rowid")
+    stmt = sa.select(*_LIB_LIST_COLS).order_by(rowid)
+    if limit is not None:
+        stmt = stmt.limit(limit)
     async with async_conn() as conn:
-        rows = (await conn.execute(sa.select(*_LIB_LIST_COLS))).fetchall()
-    return [dict(r._mapping) for r in rows]
+        if cursor:
+            after = (
+                await conn.execute(sa.select(rowid).where(t.libraries.c._id == cursor))
+            ).scalar()
+            if after is None:
+                raise HTTPException(status_code=422, detail="unknown cursor")
+            stmt = stmt.where(rowid > after)
+        rows = (await conn.execute(stmt)).fetchall()
+    items = [dict(r._mapping) for r in rows]
+    headers = {}
+    if limit is not None and len(items) == limit:
+        headers["X-Next-Cursor"] = items[-1]["_id"]
+    return JSONResponse(items, headers=headers)
 
 
 @router.post("")
@@ -75,13 +106,14 @@ async def remove_library(library_id: str):
             sa.delete(t.images).where(t.images.c.library_id == library_id)
         )
         await conn.execute(
-            sa.delete(t.image_gen_raw).where(
-                t.image_gen_raw.c.library_id == library_id
-            )
+            sa.delete(t.image_gen_raw).where(t.image_gen_raw.c.library_id == library_id)
         )
-    # remove thumbnail files for this library
+        # The cascade bypasses image_tags' writers, so bump the version here.
+        await image_tags.bump_tags_version(conn)
+    # Thumbnails go only once the delete has committed: a failed transaction
+    # must leave the library intact, thumbs included.
     try:
-        await anyio.to_thread.run_sync(lambda: delete_by_prefix(f"{library_id}/"))  # type: ignore[attr-defined]
+        await anyio.to_thread.run_sync(delete_by_prefix, f"{library_id}/")  # type: ignore[attr-defined]
     except Exception:
         # ignore failures to remove files
         pass
@@ -113,32 +145,45 @@ async def reproject_library_endpoint(library_id: str):
         ).scalar()
     if found is None:
         raise HTTPException(status_code=404, detail="Library not found")
-    from ..services.reproject import reproject_library_async
-
     reproject_library_async(library_id)
     return {"reproject": library_id, "started": True}
 
 
+# What the progress poll reads. The UI polls this repeatedly during a scan,
+# so it fetches only these columns, not the whole library row.
+_PROGRESS_COLS = (
+    t.libraries.c.scanning,
+    t.libraries.c.scan_total,
+    t.libraries.c.scan_done,
+    t.libraries.c.indexed_count,
+    t.libraries.c.last_scanned,
+    t.libraries.c.scan_error,
+    t.libraries.c.scan_failed_count,
+)
+
+
 @router.get("/{library_id}/progress")
 async def library_progress(library_id: str):
     async with async_conn() as conn:
         lib = (
             await conn.execute(
-                sa.select(t.libraries).where(t.libraries.c._id == library_id)
+                sa.select(*_PROGRESS_COLS).where(t.libraries.c._id == library_id)
             )
         ).first()
     if lib is None:
         raise HTTPException(status_code=404, detail="Library not found")
     m = lib._mapping
-    return {
-        "scanning": bool(m.get("scanning", False)),
-        "scan_total": m.get("scan_total", 0),
-        "scan_done": m.get("scan_done", 0),
-        "indexed_count": m.get("indexed_count", 0),
-        "last_scanned": m.get("last_scanned"),
-        "scan_error": m.get("scan_error"),
-        "scan_failed_count": m.get("scan_failed_count", 0),
-    }
+    return JSONResponse(
+        {
+            "scanning": bool(m.get("scanning", False)),
+            "scan_total": m.get("scan_total", 0),
+            "scan_done": m.get("scan_done", 0),
+            "indexed_count": m.get("indexed_count", 0),
+            "last_scanned": m.get("last_scanned"),
+            "scan_error": m.get("scan_error"),
+            "scan_failed_count": m.get("scan_failed_count", 0),
+        }
+    )
 
 
 @router.patch("/{library_id}")
@@ -9,6 +9,7 @@ from __future__ import annotations
 
 import time
 
+import anyio  # type: ignore[import-not-found]
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
@@ -18,7 +19,8 @@ from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from ..database.db import async_conn, async_tx
 from ..database import schema as t
 from ..services import gen_metadata
-from ..services.image_tags import id_candidates
+from ..services.image_tags import find_gen_raw
+from ..services.reproject import reproject_by_sig_async
 
 router = APIRouter()
 
@@ -108,8 +110,6 @@ async def put_ruleset(sig: str, body: RulesetBody):
         )
         await conn.execute(stmt)
     # Re-derive gen.* for every image of this signature (sig-global).
-    from ..services.reproject import reproject_by_sig_async
-
     reproject_by_sig_async(sig)
     return _ruleset_doc(sig, doc)
 
@@ -120,8 +120,6 @@ async def delete_ruleset(sig: str):
         await conn.execute(
             sa.delete(t.gen_rulesets).where(t.gen_rulesets.c.sig == sig)
         )
-    from ..services.reproject import reproject_by_sig_async
-
     reproject_by_sig_async(sig)
     return {"deleted": sig}
 
@@ -132,23 +130,17 @@ async def preview_ruleset(body: PreviewBody):
 
     Returns the final ``gen`` (== what reproject would write) plus per-path
     resolution so the UI can show whether each pin fired."""
-    async with async_conn() as conn:
-        raw = None
-        for candidate in id_candidates(body.sample_image_id):
-            row = (
-                await conn.execute(
-                    sa.select(t.image_gen_raw.c.raw).where(
-                        t.image_gen_raw.c._id == candidate
-                    )
-                )
-            ).first()
-            if row is not None:
-                raw = row.raw
-                break
+    raw = await find_gen_raw(body.sample_image_id)
     if not raw:
         raise HTTPException(status_code=404, detail="No generation data for image")
 
     fields = gen_metadata.clean_rule_fields(body.fields)
+    # A raw ComfyUI graph can run to megabytes: walk it on a worker thread so
+    # the editor's live preview doesn't stall every other request meanwhile.
+    return await anyio.to_thread.run_sync(_preview, raw, fields)  # type: ignore[attr-defined]
+
+
+def _preview(raw: dict, fields: dict[str, list[str]]) -> dict:
     gen = gen_metadata.extract(raw, {"fields": fields})
     paths = gen_metadata.resolve_ruleset_paths(raw, fields)
     # A pin resolving to a non-finite float (NaN/Infinity) would 500 on render.
@@ -1,42 +1,73 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
-from urllib.parse import quote
+import gzip
 import time
 import asyncio
 
+import anyio  # type: ignore[import-not-found]
+
 import sqlalchemy as sa
 from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from ..database.db import async_conn, async_tx
 from ..database import schema as t
-from ._utils import validate_tags
+from ._utils import accepts_gzip, quote_id, validate_tags
 from ..services import image_tags
-
-_TAGS_CACHE: dict[str, tuple[float, list[dict]]] = {}
-_TAGS_TTL_SECONDS = 30.0
-_CACHE_LOCK = asyncio.Lock()
-
-# Per-tag mosaic samples: small, short-lived cache keyed by (tag, per).
-_SAMPLES_CACHE: dict[tuple[str, int], tuple[float, list[dict]]] = {}
+from ..services.ai_jobs import get_ai_job_manager
+
+# Per-tag mosaic samples: small, short-lived cache keyed by (tag, per). Each
+# entry is stamped with the shared tag-data version (``image_tags.tags_version``)
+# it was built at. Any tag write — from any worker, the AI job runner or the
+# scanner — bumps that version, so a hit is only served while nothing changed;
+# the TTL additionally reshuffles the random picks. Plain dict get/set with no
+# await in between, so the event loop already serialises it — no lock.
+_SAMPLES_CACHE: dict[tuple[str, int], tuple[int, float, list[dict]]] = {}
 _SAMPLES_TTL_SECONDS = 60.0
-_SAMPLES_LOCK = asyncio.Lock()
+
+# Rendered /tags bodies keyed by the listing flags, stamped with the same
+# version. No TTL: an entry stays valid exactly until the next tag write. The
+# version is read *before* the query, so a write racing the build only makes
+# the entry look older than it is — it is rebuilt, never served stale.
+#
+# Each entry holds the JSON and, past the GZip middleware's size floor, that
+# JSON pre-gzipped once at max level off the event loop. Hits send the stored
+# bytes as-is (the middleware passes a set Content-Encoding through), so a
+# multi-MB listing is neither re-serialised nor re-compressed per request.
+_ListBody = tuple[bytes, bytes | None]  # (json, gzipped json or None)
+_LIST_CACHE: dict[tuple[bool, bool, bool], tuple[int, _ListBody]] = {}
+# Single-flight: the build in progress per key, with the version it is for.
+# Concurrent misses (a cold start, or every open tab refetching right after a
+# write) await that one build instead of each running the same query.
+_LIST_BUILDS: dict[tuple[bool, bool, bool], tuple[int, asyncio.Task[_ListBody]]] = {}
+_GZIP_MIN_SIZE = 1000  # matches GZipMiddleware(minimum_size=...) in main
 
 router = APIRouter()
 
 
-def _thumb_url(image_id: str, thumb_key: str | None = None) -> str:
+def invalidate_tag_caches() -> None:
+    """Drop this process's L1 entries (tests re-point the DB, resetting versions)."""
+    _SAMPLES_CACHE.clear()
+    _LIST_CACHE.clear()
+    _LIST_BUILDS.clear()
+
+
+def _thumb_url(image_id: str, mtime: float | None = None) -> str:
     """The streaming /thumb route. Lets the grid render <img src> with no extra
-    hop. `thumb_key` is accepted for call-site parity but no longer needed."""
-    return f"/api/images/{quote(image_id, safe='')}/thumb"
+    hop. Versioned by ``mtime`` like the feed's, so a regenerated thumb isn't
+    masked by the route's immutable caching."""
+    url = f"/api/images/{quote_id(image_id)}/thumb"
+    return f"{url}?v={int(mtime)}" if mtime is not None else url
 
 
-async def _samples_for_tag(tag: str, per: int) -> list[dict]:
-    now = time.time()
+async def _samples_for_tag(tag: str, per: int, version: int) -> list[dict]:
+    # Monotonic: a wall-clock step (NTP sync, manual clock change) must not
+    # pin or instantly expire every entry.
+    now = time.monotonic()
     cache_key = (tag, per)
-    async with _SAMPLES_LOCK:
-        cached = _SAMPLES_CACHE.get(cache_key)
-        if cached and (now - cached[0]) < _SAMPLES_TTL_SECONDS:
-            return cached[1]
+    cached = _SAMPLES_CACHE.get(cache_key)
+    if cached and cached[0] == version and now - cached[1] < _SAMPLES_TTL_SECONDS:
+        return cached[2]
 
     cols = (
         t.images.c._id,
@@ -44,6 +75,7 @@ async def _samples_for_tag(tag: str, per: int) -> list[dict]:
         t.images.c.width,
         t.images.c.height,
         t.images.c.blurhash,
+        t.images.c.mtime,
     )
     out: list[dict] = []
     seen: set[str] = set()
@@ -74,22 +106,22 @@ async def _samples_for_tag(tag: str, per: int) -> list[dict]:
                 out.append(dict(row._mapping))
 
         # ORDER BY RANDOM() gives varied, non-duplicated images across tags — fixes
-        # common tags all showing the same most-recent image. Full scan + sort of
-        # the matching rows, but the result is cached (TTL) and per-tag match sets
-        # are small. Over-fetch to backfill any collision with the pinned image.
+        # common tags all showing the same most-recent image. The random pick
+        # runs over ids alone (covered by ix_image_tags_tag_image); only the few picked
+        # rows are then read from `images`, not every row carrying the tag.
+        # Over-fetch to backfill any collision with the pinned image.
         remaining = per - len(out)
         if remaining > 0:
+            picked = (
+                sa.select(t.image_tags.c.image_id)
+                .where(t.image_tags.c.tag == tag)
+                .order_by(sa.func.random())
+                .limit(remaining + (1 if pinned else 0))
+                .subquery()
+            )
             rows = (
                 await conn.execute(
-                    sa.select(*cols)
-                    .select_from(
-                        t.images.join(
-                            t.image_tags, t.image_tags.c.image_id == t.images.c._id
-                        )
-                    )
-                    .where(t.image_tags.c.tag == tag)
-                    .order_by(sa.func.random())
-                    .limit(remaining + (1 if pinned else 0))
+                    sa.select(*cols).join(picked, picked.c.image_id == t.images.c._id)
                 )
             ).fetchall()
             for row in rows:
@@ -103,15 +135,14 @@ async def _samples_for_tag(tag: str, per: int) -> list[dict]:
     samples = [
         {
             "_id": d["_id"],
-            "thumb_url": _thumb_url(d["_id"]),
+            "thumb_url": _thumb_url(d["_id"], d.get("mtime")),
             "width": d.get("width"),
             "height": d.get("height"),
             "blurhash": d.get("blurhash"),
         }
         for d in out
     ]
-    async with _SAMPLES_LOCK:
-        _SAMPLES_CACHE[cache_key] = (now, samples)
+    _SAMPLES_CACHE[cache_key] = (version, now, samples)
     return samples
 
 
@@ -121,82 +152,148 @@ class TagThumbnailSet(BaseModel):
 
 @router.get("")
 async def list_tags(
+    request: Request,
     include_manual: bool = False,
     include_prompt: bool = False,
     merge_sources: bool = False,
 ):
-    now = time.time()
-    cache_key = f"m{int(include_manual)}:p{int(include_prompt)}:s{int(merge_sources)}"
-    async with _CACHE_LOCK:
-        cached = _TAGS_CACHE.get(cache_key)
-        if cached and (now - cached[0]) < _TAGS_TTL_SECONDS:
-            return cached[1]
-
+    # Served from the trigger-maintained counter tables (schema.tag_counts /
+    # base_counts): a read of one row per distinct tag, no aggregation. The
+    # rendered body is cached per worker until the shared tag version moves,
+    # so repeat loads between writes cost one primary-key read — and a client
+    # revalidating with the version's ETag gets a bodiless 304 for that read.
+    # The ETag also carries the database's nonce: the version restarts when
+    # the DB file is recreated, and a bare "N" would 304 an old DB's list.
+    cache_key = (include_manual, include_prompt, merge_sources)
+    version, nonce = await image_tags.tags_version_and_nonce()
+    etag = f'W/"{nonce}-{version}"'
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    cached = _LIST_CACHE.get(cache_key)
+    if cached and cached[0] == version:
+        return _list_response(request, cached[1], etag)
+    build = _LIST_BUILDS.get(cache_key)
+    if build is None or build[0] != version:
+        task = asyncio.ensure_future(_build_list_body(cache_key))
+        build = _LIST_BUILDS[cache_key] = (version, task)
+
+        def _settle(done: asyncio.Task[_ListBody]) -> None:
+            if _LIST_BUILDS.get(cache_key, (None, None))[1] is done:
+                del _LIST_BUILDS[cache_key]
+            if done.cancelled() or done.exception() is not None:
+                return
+            # A build for a later version may have finished first; keep it.
+            current = _LIST_CACHE.get(cache_key)
+            if current is None or current[0] <= version:
+                _LIST_CACHE[cache_key] = (version, done.result())
+
+        task.add_done_callback(_settle)
+    # Shielded: one waiter disconnecting must not cancel the others' build.
+    return _list_response(request, await asyncio.shield(build[1]), etag)
+
+
+async def _build_list_body(key: tuple[bool, bool, bool]) -> _ListBody:
+    body = await _build_tag_list(*key)
+    if len(body) < _GZIP_MIN_SIZE:
+        return body, None
+    gz = await anyio.to_thread.run_sync(gzip.compress, body, 9)  # type: ignore[attr-defined]
+    return body, gz
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """Weak ``If-None-Match`` comparison, as a GET revalidation uses."""
+    inm = request.headers.get("if-none-match")
+    if inm is None:
+        return False
+    want = etag.removeprefix("W/")
+    return any(v.strip().removeprefix("W/") in (want, "*") for v in inm.split(","))
+
+
+def _list_response(request: Request, cached: _ListBody, etag: str) -> Response:
+    body, gz = cached
+    # The version stamps every entry (and both encodings), so it is the ETag;
+    # no-cache makes the browser revalidate each load instead of guessing.
+    # Vary on both encodings, so a shared cache never hands one client's
+    # gzip body to another that didn't ask for it (or the other way round).
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if gz is not None and accepts_gzip(request.headers.get("accept-encoding", "")):
+        headers["Content-Encoding"] = "gzip"
+        return Response(gz, media_type="application/json", headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+async def _build_tag_list(
+    include_manual: bool, include_prompt: bool, merge_sources: bool
+) -> bytes:
     # Merge mode (gallery search): collapse the three sources of each tag into
     # one cross-source `any:<base>` entry counting *distinct images*, so a tag
     # the user both prompt- and manual-tagged isn't double-counted. No thumbs —
     # the autocomplete only needs id + count.
     if merge_sources:
-        stmt = (
-            sa.select(
-                t.image_tags.c.base,
-                sa.func.count(sa.distinct(t.image_tags.c.image_id)).label("count"),
-            )
-            .group_by(t.image_tags.c.base)
-            .order_by(sa.text("count DESC"))
+        stmt = sa.select(t.base_counts.c.base, t.base_counts.c.count).order_by(
+            t.base_counts.c.count.desc()
         )
         async with async_conn() as conn:
             rows = (await conn.execute(stmt)).fetchall()
-        merged = [
-            {"_id": f"{image_tags.ANY_PREFIX}{r.base}", "count": r.count}
-            for r in rows
-            if r.base
-        ]
-        async with _CACHE_LOCK:
-            _TAGS_CACHE[cache_key] = (now, merged)
-        return merged
+        return _render(
+            [
+                {"_id": f"{image_tags.ANY_PREFIX}{r.base}", "count": r.count}
+                for r in rows
+                if r.base
+            ]
+        )
 
     # AI tags are primary (no prefix). Manual tags are `manual:<tag>`, prompt-
     # extracted tags are `prompt:<term>`. By default the browser is AI-only; the
-    # Tags view opts into the other kinds.
-    stmt = sa.select(
-        t.image_tags.c.tag,
-        sa.func.count().label("count"),
-        # MAX picks the newest image id (ids sort like _id desc) for the default
-        # mosaic thumbnail.
-        sa.func.max(t.image_tags.c.image_id).label("sample_image_id"),
-    )
-    for prefix in image_tags.excluded_prefixes(
-        include_manual=include_manual, include_prompt=include_prompt
+    # Tags view opts into the other kinds. Hidden kinds are skipped as key
+    # ranges (one PK seek per kept span), not tested per row with LIKE: the
+    # usually-numerous `prompt:` terms are never read.
+    counts = t.tag_counts
+    spans = []
+    for lo, hi in image_tags.kept_tag_ranges(
+        image_tags.excluded_prefixes(
+            include_manual=include_manual, include_prompt=include_prompt
+        )
     ):
-        stmt = stmt.where(~t.image_tags.c.tag.like(f"{prefix}%"))
-    stmt = stmt.group_by(t.image_tags.c.tag).order_by(sa.text("count DESC"))
+        span = sa.select(counts.c.tag, counts.c.count)
+        if lo is not None:
+            span = span.where(counts.c.tag >= lo)
+        if hi is not None:
+            span = span.where(counts.c.tag < hi)
+        spans.append(span)
+    tc = (sa.union_all(*spans) if len(spans) > 1 else spans[0]).subquery("tc")
+    # MAX picks the newest image id (ids sort like _id desc) for the default
+    # mosaic thumbnail — one seek per tag on ix_image_tags_tag_image (tag, image_id).
+    newest = (
+        sa.select(sa.func.max(t.image_tags.c.image_id))
+        .where(t.image_tags.c.tag == tc.c.tag)
+        .scalar_subquery()
+    )
+    stmt = sa.select(
+        tc.c.tag,
+        tc.c.count,
+        # A pinned thumbnail (tag_meta) wins over the newest image.
+        sa.func.coalesce(t.tag_meta.c.thumb_image_id, newest).label("thumb_image_id"),
+    ).select_from(tc.outerjoin(t.tag_meta, t.tag_meta.c.tag == tc.c.tag))
+    # One span (every kind shown) walks ix_tag_counts_count already in count
+    # order. With hidden kinds, `+count` keeps the planner off that index:
+    # scanning it would read every tag to filter, where the span seeks read only
+    # the kept ones and sort that (much smaller) set.
+    order = tc.c.count if len(spans) == 1 else sa.literal_column("+tc.count")
+    stmt = stmt.order_by(order.desc())
 
     async with async_conn() as conn:
         rows = (await conn.execute(stmt)).fetchall()
-        tag_ids = [r.tag for r in rows]
-        overrides: dict[str, str] = {}
-        if tag_ids:
-            ov_rows = (
-                await conn.execute(
-                    sa.select(t.tag_meta.c.tag, t.tag_meta.c.thumb_image_id).where(
-                        t.tag_meta.c.tag.in_(tag_ids)
-                    )
-                )
-            ).fetchall()
-            overrides = {r.tag: r.thumb_image_id for r in ov_rows if r.thumb_image_id}
+    return _render(
+        [
+            {"_id": r.tag, "count": r.count, "thumb_image_id": r.thumb_image_id}
+            for r in rows
+        ]
+    )
 
-    result = [
-        {
-            "_id": r.tag,
-            "count": r.count,
-            "thumb_image_id": overrides.get(r.tag) or r.sample_image_id,
-        }
-        for r in rows
-    ]
-    async with _CACHE_LOCK:
-        _TAGS_CACHE[cache_key] = (now, result)
-    return result
+
+def _render(content: list[dict]) -> bytes:
+    return bytes(JSONResponse(content).body)
 
 
 @router.get("/samples")
@@ -211,8 +308,11 @@ async def tag_samples(
     if len(tags) > 200:
         raise HTTPException(status_code=422, detail="too many tags (max 200)")
     tags = validate_tags(tags, max_count=200)
-    results = await asyncio.gather(*[_samples_for_tag(tag, per) for tag in tags])
-    return {tag: samples for tag, samples in zip(tags, results)}
+    version = await image_tags.tags_version()
+    results = await asyncio.gather(
+        *[_samples_for_tag(tag, per, version) for tag in tags]
+    )
+    return JSONResponse({tag: samples for tag, samples in zip(tags, results)})
 
 
 @router.post("/thumbnail/{tag:path}")
@@ -249,10 +349,7 @@ async def set_tag_thumbnail(tag: str, body: TagThumbnailSet):
             },
         )
         await conn.execute(stmt)
-
-    async with _CACHE_LOCK:
-        _TAGS_CACHE.clear()
-        _SAMPLES_CACHE.clear()
+        await image_tags.bump_tags_version(conn)
     return {"tag": tag, "thumb_image_id": image_id}
 
 
@@ -261,19 +358,14 @@ async def clear_tag_thumbnail(tag: str):
     tag = validate_tags([tag])[0]
     async with async_tx() as conn:
         await conn.execute(sa.delete(t.tag_meta).where(t.tag_meta.c.tag == tag))
-    async with _CACHE_LOCK:
-        _TAGS_CACHE.clear()
-        _SAMPLES_CACHE.clear()
+        await image_tags.bump_tags_version(conn)
     return {"tag": tag, "cleared": True}
 
 
 @router.post("/apply/{image_id}")
 async def apply_tags(image_id: str, tags: list[str]):
-    added = [image_tags.to_manual(tag) for tag in validate_tags(tags)]
-    await image_tags.apply_manual(image_id, validate_tags(tags))
-    async with _CACHE_LOCK:
-        _TAGS_CACHE.clear()
-        _SAMPLES_CACHE.clear()
+    tags = validate_tags(tags)
+    added = await image_tags.apply_manual(image_id, tags)
     return {"image_id": image_id, "added": added}
 
 
@@ -281,9 +373,6 @@ async def apply_tags(image_id: str, tags: list[str]):
 async def remove_tags(image_id: str, tags: list[str]):
     tags = validate_tags(tags)
     await image_tags.remove_tags(image_id, tags)
-    async with _CACHE_LOCK:
-        _TAGS_CACHE.clear()
-        _SAMPLES_CACHE.clear()
     return {"image_id": image_id, "removed": tags}
 
 
@@ -291,8 +380,6 @@ async def remove_tags(image_id: str, tags: list[str]):
 async def ai_tag(image_id: str):
     # Deprecated route retained for convenience.
     # Internal AI tagging is implemented under /ai/*.
-    from ..services.ai_jobs import get_ai_job_manager
-
     jm = get_ai_job_manager()
-    job = await jm.enqueue(ids=[image_id])
+    job = await jm.enqueue(ids=[image_id], coalesce=True)
     return {"job_id": job.id}
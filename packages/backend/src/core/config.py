@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -37,9 +38,23 @@ class Settings(BaseSettings):
     # process working directory.
     model_cache_dir: str = ".cache/tagify/models"
 
+    # ONNX Runtime intra-op threads for the AI tagger. 0 leaves it to ORT
+    # (one per physical core); set lower to leave cores for the scanner.
+    ai_intra_op_threads: int = 0
+    # "int8" runs a dynamically quantized copy of the tagger model (built once,
+    # next to the downloaded one): faster on CPU, at slightly different scores.
+    # Building it needs the optional `onnx` package. "off" uses the model as is.
+    ai_quantize: Literal["off", "int8"] = "off"
+
     thumb_max_size: int = 1080
     thumb_format: str = "webp"
 
+    # Read size when streaming media bodies (bytes). Starlette's 64 KiB default
+    # costs a worker-thread read + ASGI send per chunk; multi-MB originals and
+    # ~100-300 KiB thumbs (up to `thumb_max_size` px) stream in far fewer steps.
+    media_chunk_original: int = 1 << 20
+    media_chunk_thumb: int = 256 << 10
+
     log_slow_requests_ms: int = 1000
 
     rate_limit_enabled: bool = False
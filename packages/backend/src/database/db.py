@@ -17,7 +17,7 @@ from __future__ import annotations
 import asyncio
 import threading
 from collections.abc import AsyncIterator, Iterator
-from contextlib import asynccontextmanager, contextmanager
+from contextlib import ExitStack, asynccontextmanager, contextmanager
 
 import sqlalchemy as sa
 from sqlalchemy import Connection, create_engine, event
@@ -29,7 +29,7 @@ from sqlalchemy.ext.asyncio import (
 )
 
 from ..core.config import settings
-from .schema import metadata
+from .schema import RETIRED_INDEXES, metadata
 
 _async_engine: AsyncEngine | None = None
 _sync_engine: Engine | None = None
@@ -109,16 +109,44 @@ def sync_write_lock() -> threading.Lock:
     return _sync_write_lock
 
 
+def _create_schema(conn: Connection) -> None:
+    """``create_all`` plus any index added after the table already existed —
+    ``create_all`` only emits indexes alongside a table it creates itself — and
+    minus the ones the schema has since retired."""
+    metadata.create_all(conn)
+    for name in RETIRED_INDEXES:
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+    # IF NOT EXISTS rather than checkfirst: reflection can't see expression
+    # indexes (``ix_images_id_slash``) and would warn + re-create them.
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            conn.execute(sa.schema.CreateIndex(index, if_not_exists=True))
+
+
 async def ensure_schema() -> None:
     """Create tables + indexes if absent. Idempotent; safe on startup."""
     async with get_async_engine().begin() as conn:
-        await conn.run_sync(metadata.create_all)
+        await conn.run_sync(_create_schema)
+
+
+def warm_sync_pool() -> None:
+    """Open the sync engine's persistent pool connections up front (startup).
+
+    The async engine is already warm once :func:`ensure_schema` ran. The sync
+    one is first touched by the media routes, so without this the first grid
+    load opens every connection inside its burst, each paying the file open +
+    per-connection pragmas (~3x that burst's latency). Held together so the
+    pool opens distinct connections, then all checked back in."""
+    engine = get_sync_engine()
+    with ExitStack() as stack:
+        for _ in range(engine.pool.size()):  # type: ignore[attr-defined]
+            stack.enter_context(engine.connect())
 
 
 def ensure_schema_sync() -> None:
     """Sync schema creation (tests / scripts without an event loop)."""
     with get_sync_engine().begin() as conn:
-        metadata.create_all(conn)
+        _create_schema(conn)
 
 
 async def reset_engines() -> None:
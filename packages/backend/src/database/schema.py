@@ -11,6 +11,11 @@ Design notes:
   *rebuilt transactionally* from that array on every tag write (see
   :mod:`services.image_tags`); they exist only to serve ``GROUP BY`` / ``$in`` /
   ``$all`` style queries the JSON array can't index.
+- ``tag_counts`` / ``base_counts`` are per-tag (and per cross-source base, in
+  distinct images) counts kept current by triggers on ``image_tags``, so the tag
+  cloud reads a few thousand counter rows instead of grouping every join row.
+  Triggers, not app code, because every writer (async repo, scanner threads, FK
+  cascades on image/library delete) goes through that one table.
 - ``gen.*`` scalars filtered in the feed (model / workflow_sig / group_id / prompt)
   are promoted to indexed columns; the full ``gen`` subdoc is kept as JSON for the
   workflow endpoint and reprojection.
@@ -78,6 +83,22 @@ image_tags = sa.Table(
     sa.Column("base", sa.Text, nullable=False),
 )
 
+# Materialized from image_tags by the triggers below; never written by app code.
+tag_counts = sa.Table(
+    "tag_counts",
+    metadata,
+    sa.Column("tag", sa.Text, primary_key=True),
+    sa.Column("count", sa.Integer, nullable=False),
+)
+# Distinct images per `base`: an image with both `manual:cat` and `prompt:cat`
+# counts once toward `cat`.
+base_counts = sa.Table(
+    "base_counts",
+    metadata,
+    sa.Column("base", sa.Text, primary_key=True),
+    sa.Column("count", sa.Integer, nullable=False),
+)
+
 # Derived from images.gen.prompt_terms.
 image_gen_terms = sa.Table(
     "image_gen_terms",
@@ -136,7 +157,8 @@ gen_rulesets = sa.Table(
     sa.Column("doc", sa.JSON),
 )
 
-# Singleton key/value store for app settings (currently only the "ai" row).
+# Singleton key/value store for app settings (the "ai" row) and small shared
+# counters (``tags_version``, see services.image_tags).
 app_settings = sa.Table(
     "app_settings",
     metadata,
@@ -147,24 +169,123 @@ app_settings = sa.Table(
 
 # --- Indexes (mirror the previous Mongo index set) ---------------------------
 sa.Index("ix_images_lib_id", images.c.library_id, images.c._id.desc())
+# The "untagged" / "no AI tags" feeds and the tag-untagged job picker only ever
+# ask for the flag being false, so these index just those rows (partial): they
+# stay as small as the curation backlog, tagging an image drops it out instead
+# of rewriting an entry, and each walks `_id` desc straight off the index.
+# The WHERE matches the query's `IS 0` exactly so the planner can use it; the
+# library variants keep the flag as a key column so, with no ANALYZE stats,
+# their extra equality term ranks them above plain `ix_images_lib_id`.
+_UNTAGGED = images.c.has_tags.is_(False)
+_NO_AI_TAGS = images.c.has_ai_tags.is_(False)
+sa.Index("ix_images_untagged", images.c._id.desc(), sqlite_where=_UNTAGGED)
+sa.Index("ix_images_no_ai_tags", images.c._id.desc(), sqlite_where=_NO_AI_TAGS)
 sa.Index(
-    "ix_images_lib_has_tags",
+    "ix_images_lib_untagged",
     images.c.library_id,
     images.c.has_tags,
     images.c._id.desc(),
+    sqlite_where=_UNTAGGED,
 )
 sa.Index(
-    "ix_images_lib_has_ai_tags",
+    "ix_images_lib_no_ai_tags",
     images.c.library_id,
     images.c.has_ai_tags,
     images.c._id.desc(),
+    sqlite_where=_NO_AI_TAGS,
+)
+# `_id` with `\` folded to `/`: one probe finds an image under either path
+# spelling. Literal (not bound) args so lookups match the indexed expression.
+# Carries `_id`/`path`/`thumb_key` so id resolution and the media routes'
+# lookups are answered from the index alone (covering).
+ID_SLASH = sa.func.replace(
+    images.c._id, sa.literal_column("'\\'"), sa.literal_column("'/'")
+)
+sa.Index(
+    "ix_images_id_slash",
+    ID_SLASH,
+    images.c._id,
+    images.c.path,
+    images.c.thumb_key,
 )
 sa.Index("ix_images_gen_model", images.c.gen_model, images.c._id.desc())
 sa.Index("ix_images_gen_workflow_sig", images.c.gen_workflow_sig)
 sa.Index("ix_images_gen_group_id", images.c.gen_group_id)
-sa.Index("ix_image_tags_tag", image_tags.c.tag)
-sa.Index("ix_image_tags_base", image_tags.c.base)
+# Carry image_id so tag counts / MAX(image_id) / DISTINCT image_id per base are
+# answered from the index alone (covering), never touching the table rows.
+sa.Index("ix_image_tags_tag_image", image_tags.c.tag, image_tags.c.image_id)
+sa.Index("ix_image_tags_base_image", image_tags.c.base, image_tags.c.image_id)
 sa.Index("ix_image_gen_terms_term", image_gen_terms.c.term)
-sa.Index("ix_gen_raw_lib", image_gen_raw.c.library_id)
+# The merged-sources and all-kinds tag lists read every row in count order:
+# walking these covering indexes returns them pre-sorted, with no temp B-tree.
+sa.Index("ix_base_counts_count", base_counts.c.count.desc(), base_counts.c.base)
+sa.Index("ix_tag_counts_count", tag_counts.c.count.desc(), tag_counts.c.tag)
+# Library-scoped reads (reproject, library delete) seek on this index's
+# `library_id` prefix; a separate single-column index would be pure write cost.
 sa.Index("ix_gen_raw_lib_sig", image_gen_raw.c.library_id, image_gen_raw.c.workflow_sig)
 sa.Index("ix_gen_raw_sig", image_gen_raw.c.workflow_sig)
+
+
+# Indexes earlier releases created that the set above replaces; dropped on
+# startup so existing databases stop maintaining them.
+RETIRED_INDEXES = (
+    "ix_images_has_tags",
+    "ix_images_has_ai_tags",
+    "ix_images_lib_has_tags",
+    "ix_images_lib_has_ai_tags",
+    "ix_gen_raw_lib",  # a prefix of ix_gen_raw_lib_sig
+    "ix_image_tags_tag",  # single-column; now ix_image_tags_tag_image
+    "ix_image_tags_base",  # single-column; now ix_image_tags_base_image
+)
+
+
+# --- Count-maintenance triggers ----------------------------------------------
+#
+# AFTER INSERT sees its own row, hence `tag != NEW.tag` when asking whether the
+# image already counted toward this base; AFTER DELETE no longer sees OLD.
+_COUNT_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_image_tags_count_ins
+    AFTER INSERT ON image_tags BEGIN
+        INSERT INTO tag_counts (tag, count) VALUES (NEW.tag, 1)
+            ON CONFLICT (tag) DO UPDATE SET count = count + 1;
+        INSERT INTO base_counts (base, count)
+            SELECT NEW.base, 1 WHERE NOT EXISTS (
+                SELECT 1 FROM image_tags
+                WHERE image_id = NEW.image_id AND base = NEW.base
+                  AND tag != NEW.tag
+            )
+            ON CONFLICT (base) DO UPDATE SET count = count + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_image_tags_count_del
+    AFTER DELETE ON image_tags BEGIN
+        UPDATE tag_counts SET count = count - 1 WHERE tag = OLD.tag;
+        DELETE FROM tag_counts WHERE tag = OLD.tag AND count <= 0;
+        UPDATE base_counts SET count = count - 1
+            WHERE base = OLD.base AND NOT EXISTS (
+                SELECT 1 FROM image_tags
+                WHERE image_id = OLD.image_id AND base = OLD.base
+            );
+        DELETE FROM base_counts WHERE base = OLD.base AND count <= 0;
+    END
+    """,
+)
+# One-time backfill when the counter tables are first created (fresh DB, or an
+# existing one upgrading): seed them from the join rows already present.
+_COUNT_BACKFILL = (
+    "INSERT INTO tag_counts (tag, count)"
+    " SELECT tag, COUNT(*) FROM image_tags GROUP BY tag",
+    "INSERT INTO base_counts (base, count)"
+    " SELECT base, COUNT(DISTINCT image_id) FROM image_tags GROUP BY base",
+)
+
+
+@sa.event.listens_for(metadata, "after_create")
+def _install_count_triggers(target, connection, tables=(), **kw) -> None:
+    if tag_counts in tables:
+        for stmt in _COUNT_BACKFILL:
+            connection.exec_driver_sql(stmt)
+    for stmt in _COUNT_TRIGGERS:
+        connection.exec_driver_sql(stmt)
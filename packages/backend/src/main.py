@@ -4,8 +4,11 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.types import Receive, Scope, Send
 from .api import libraries, images, tags, ai, rules
-from .database.db import ensure_schema
+from .api._utils import accepts_gzip
+from .database.db import ensure_schema, reset_engines, warm_sync_pool
 from .core.config import settings
 from .services.storage_fs import ensure_thumb_root
 from .services.ai_jobs import get_ai_job_manager, get_ai_settings
@@ -23,6 +26,9 @@ async def lifespan(app: FastAPI):
     # Startup: create the SQLite schema (tables + indexes) if absent. Declarative
     # DDL means no flag backfill is needed — columns carry their defaults.
     await ensure_schema()
+    # Pre-open the media routes' sync connections so the first grid load
+    # doesn't pay for them (and a bad DB path fails here, not on a request).
+    await anyio.to_thread.run_sync(warm_sync_pool)  # type: ignore[attr-defined]
     # Ensure the thumbnail root dir exists (run off the event loop)
     await anyio.to_thread.run_sync(ensure_thumb_root)  # type: ignore[attr-defined]
 
@@ -38,13 +44,34 @@ async def lifespan(app: FastAPI):
 
     yield
 
-    # Shutdown: add cleanup if needed in the future
+    # Shutdown: stop the AI worker first, so nothing writes through the
+    # engines below while they close.
+    await jm.stop()
+    # Close both engines' pooled connections. The last SQLite
+    # connection to close checkpoints the WAL back into the main file, so a
+    # clean stop leaves no -wal to replay on the next start.
+    await reset_engines()
+
+
+class _GZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that honours ``gzip;q=0``: its own check is a substring
+    match on ``Accept-Encoding``, so a refused gzip would still be sent."""
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and not accepts_gzip(
+            Headers(scope=scope).get("accept-encoding", "")
+        ):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
 
 
 app = FastAPI(title="Tagify API", version="0.1.0", lifespan=lifespan)
 
-# GZip compression for JSON responses
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+# GZip compression for JSON responses. Level 6 rather than the default 9: on a
+# multi-MB tag listing that is ~4x less CPU on the event loop for ~4% more bytes.
+# /tags pre-compresses its cached bodies at 9 itself (see api.tags).
+app.add_middleware(_GZipMiddleware, minimum_size=1000, compresslevel=6)
 
 # CORS: allow frontend dev server and Docker frontend
 app.add_middleware(
@@ -113,7 +140,7 @@ async def _timing_and_rate_limit(request: Request, call_next):
 
 
 @app.get("/health")
-def health():
+async def health():
     return {"status": "ok"}
 
 
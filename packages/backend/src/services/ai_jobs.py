@@ -1,14 +1,18 @@
 from __future__ import annotations
 
 import asyncio
-from collections import deque
+import hashlib
+from collections import OrderedDict, deque
+from collections.abc import Mapping
 import time
 import uuid
 from dataclasses import dataclass, field
+from itertools import islice
 from typing import Any
 
 import sqlalchemy as sa
 
+from ..core.config import settings as app_settings
 from ..database.db import async_conn
 from ..database import schema as t
 from . import image_tags
@@ -23,6 +27,29 @@ __all__ = [
     "get_ai_job_manager",
 ]
 
+# Tagging results are written in batches: one transaction (so one commit, one
+# version bump) per ``_WRITE_BATCH`` images, or per ``_WRITE_INTERVAL_S`` on a
+# slow model, so job progress still moves roughly every second.
+_WRITE_BATCH = 32
+_WRITE_INTERVAL_S = 1.0
+# Images per model call: one path lookup, concurrent file reads, and a single
+# batched inference per ``_PREDICT_BATCH`` ids.
+_PREDICT_BATCH = 8
+# enqueue_untagged excludes queued ids in SQL up to this many bound values;
+# past it the statement would balloon and enqueue's own check filters instead.
+_NOT_IN_MAX = 1000
+# Per-job error entries kept for the UI. ``failed`` still counts every failure;
+# past this, a job over a broken library would otherwise ship thousands of
+# entries in every status poll for as long as it stays in the recent list.
+_MAX_JOB_ERRORS = 100
+# Finished jobs kept for /ai/status and /ai/jobs/{id}; the oldest are evicted.
+_MAX_JOBS = 500
+_FINISHED = frozenset(("cancelled", "done", "error"))
+# Recent predictions keyed by (content digest, model params): a duplicate file
+# elsewhere in the library, or a forced re-tag with unchanged settings, reuses
+# the result instead of running the model again.
+_PREDICTION_CACHE_SIZE = 512
+
 
 @dataclass
 class AIJob:
@@ -43,95 +70,179 @@ class AIJob:
         hundreds of image ids into every ``/status`` and ``/jobs`` poll."""
         return {k: v for k, v in self.__dict__.items() if not k.startswith("_")}
 
+    def fail(self, image_id: str, error: object) -> None:
+        """Count one failed image; its entry is kept while under the cap."""
+        self.failed += 1
+        if len(self.errors) < _MAX_JOB_ERRORS:
+            self.errors.append({"image_id": image_id, "error": str(error)})
+
 
 class _JobQueue:
     """A tiny cancellable async queue.
 
     asyncio.Queue doesn't support removing queued items (needed for cancel).
+    Here a cancel is logical: the job is marked cancelled where it sits and
+    ``get`` discards it on the way out, so cancelling is O(1) at any depth.
+    The deque is only touched from the event loop, so it needs no lock, and
+    there is exactly one consumer (the worker): an empty ``get`` parks on a
+    future that the next ``put`` resolves.
     """
 
     def __init__(self) -> None:
         self._dq: deque[AIJob] = deque()
-        self._cv = asyncio.Condition()
+        self._dropped = 0  # cancelled jobs still in the deque
+        self._wake: asyncio.Future[None] | None = None
 
     def qsize(self) -> int:
-        return len(self._dq)
+        return len(self._dq) - self._dropped
+
+    def tail(self) -> AIJob | None:
+        """The most recently queued job, if any. May be a cancelled one still
+        awaiting discard: callers check its status."""
+        return self._dq[-1] if self._dq else None
+
+    def put(self, job: AIJob) -> None:
+        self._dq.append(job)
+        if self._wake is not None and not self._wake.done():
+            self._wake.set_result(None)
 
-    async def put(self, job: AIJob) -> None:
-        async with self._cv:
-            self._dq.append(job)
-            self._cv.notify(1)
+    def drop(self) -> None:
+        """Account for a queued job just marked cancelled; ``get`` skips it."""
+        self._dropped += 1
 
     async def get(self) -> AIJob:
-        async with self._cv:
+        while True:
             while not self._dq:
-                await self._cv.wait()
-            return self._dq.popleft()
-
-    async def remove(self, job_id: str) -> bool:
-        async with self._cv:
-            for i, j in enumerate(self._dq):
-                if j.id == job_id:
-                    del self._dq[i]
-                    return True
-            return False
+                self._wake = asyncio.get_running_loop().create_future()
+                await self._wake
+            job = self._dq.popleft()
+            if job.status != "cancelled":
+                return job
+            self._dropped -= 1
 
 
 class AIJobManager:
     def __init__(self) -> None:
         self._queue = _JobQueue()
-        self._jobs: dict[str, AIJob] = {}
+        self._jobs: OrderedDict[str, AIJob] = OrderedDict()
         self._worker_task: asyncio.Task | None = None
-        # Prevent queueing the same image many times across jobs.
+        self._idle_task: asyncio.Task | None = None
+        self._predictions: OrderedDict[tuple[bytes, tuple], dict[str, Any]] = (
+            OrderedDict()
+        )
+        # Prevent queueing the same image many times across jobs. Bounded by
+        # the ids of queued + running jobs: the worker's ``finally`` and a
+        # queued cancel release them, whatever way the job ends.
         self._in_flight: set[str] = set()
 
     def start(self) -> None:
+        # Both tasks are held here: the loop keeps only weak references to
+        # tasks, and ``stop`` needs them to shut down cleanly.
         if self._worker_task is None or self._worker_task.done():
-            self._worker_task = asyncio.create_task(self._worker_loop())
-            # Start idle unload loop (uses manager-configured timeout)
-            asyncio.create_task(get_tagger_manager().idle_unload_loop())
+            self._worker_task = asyncio.create_task(
+                self._worker_loop(), name="ai-job-worker"
+            )
+        if self._idle_task is None or self._idle_task.done():
+            # Idle unload loop (uses manager-configured timeout)
+            self._idle_task = asyncio.create_task(
+                get_tagger_manager().idle_unload_loop(), name="ai-idle-unload"
+            )
+
+    async def stop(self) -> None:
+        """Cancel the worker and idle-unload loop and wait for both to unwind.
+        A job cut off mid-run leaves its unwritten images untagged."""
+        tasks = [t for t in (self._worker_task, self._idle_task) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker_task = self._idle_task = None
 
     def queue_depth(self) -> int:
         return self._queue.qsize()
 
     def list_jobs(self, limit: int = 20) -> list[AIJob]:
-        jobs = sorted(self._jobs.values(), key=lambda j: j.created_at, reverse=True)
-        return jobs[: max(1, int(limit))]
+        # ``_jobs`` is insertion-ordered and jobs are only added by ``enqueue``
+        # (stamped at insert), so newest-first is a reverse walk — no sort.
+        return list(islice(reversed(self._jobs.values()), max(1, int(limit))))
+
+    def _remember(self, job: AIJob) -> None:
+        """Record a new job, evicting the oldest finished ones past
+        ``_MAX_JOBS``. Jobs still queued or running are passed over: cancel and
+        the status routes look them up by id."""
+        self._jobs[job.id] = job
+        while len(self._jobs) > _MAX_JOBS:
+            oldest = next(
+                (j.id for j in self._jobs.values() if j.status in _FINISHED), None
+            )
+            if oldest is None:
+                break
+            del self._jobs[oldest]
+
+    def snapshot(self, limit: int = 10) -> dict[str, Any]:
+        """Recent jobs + queue depth in one call, as ``/ai/status`` serves them."""
+        return {
+            "recent": [j.public() for j in self.list_jobs(limit=limit)],
+            "queue_depth": self.queue_depth(),
+        }
 
     def get_job(self, job_id: str) -> AIJob | None:
         return self._jobs.get(job_id)
 
-    async def enqueue(self, *, ids: list[str], force: bool = False) -> AIJob:
+    async def enqueue(
+        self, *, ids: list[str], force: bool = False, coalesce: bool = False
+    ) -> AIJob:
+        """Queue a tagging job for ``ids``.
+
+        With ``coalesce``, a non-forced submission is appended to the newest job
+        that is still waiting in the queue instead of creating another one, so a
+        burst of small submissions (UI multi-select firing per image) becomes a
+        single job: one settings read and one worker pass. The returned job is
+        then the shared one, and its ``total`` covers every merged submission.
+        """
         job_id = uuid.uuid4().hex
 
-        # De-dupe within the job while preserving order.
-        unique_ids = list(dict.fromkeys([i for i in ids if i]))
-
-        # De-dupe across jobs (optional).
+        # One pass: drop empties and in-job repeats (keeping order), and unless
+        # forced, skip ids another job already holds.
+        in_flight = self._in_flight
+        seen: set[str] = set()
+        accepted: list[str] = []
         skipped = 0
-        if force:
-            accepted = unique_ids
-        else:
-            accepted = []
-            for image_id in unique_ids:
-                if image_id in self._in_flight:
-                    skipped += 1
-                    continue
-                accepted.append(image_id)
+        for image_id in ids:
+            if not image_id or image_id in seen:
+                continue
+            seen.add(image_id)
+            if not force and image_id in in_flight:
+                skipped += 1
+                continue
+            accepted.append(image_id)
+
+        if coalesce and accepted and not force:
+            tail = self._queue.tail()
+            if (
+                tail is not None
+                and tail.status == "queued"
+                and not getattr(tail, "_force", False)
+            ):
+                # Still in the deque, so the worker hasn't read its _ids yet.
+                getattr(tail, "_ids").extend(accepted)
+                tail.total += len(accepted)
+                tail.skipped += skipped
+                in_flight.update(accepted)
+                return tail
 
         job = AIJob(
             id=job_id, created_at=time.time(), total=len(accepted), skipped=skipped
         )
-        self._jobs[job_id] = job
+        self._remember(job)
 
         # Store ids on the job object (private field via attribute)
-        setattr(job, "_ids", list(accepted))
+        setattr(job, "_ids", accepted)
+        setattr(job, "_force", bool(force))
         # Track in-flight ids so we don't queue duplicates across jobs.
-        for image_id in accepted:
-            self._in_flight.add(image_id)
+        in_flight.update(accepted)
 
         if accepted:
-            await self._queue.put(job)
+            self._queue.put(job)
         else:
             # Nothing to do; mark as done so UI doesn't show it as queued forever.
             job.status = "done"
@@ -143,9 +254,15 @@ class AIJobManager:
         stmt = sa.select(t.images.c._id).where(t.images.c.has_ai_tags.is_(False))
         if library_id:
             stmt = stmt.where(t.images.c.library_id == library_id)
+        # Skip ids already queued in the query itself, so ``limit`` buys that
+        # many new images instead of re-picking the backlog the queue holds.
+        if 0 < len(self._in_flight) <= _NOT_IN_MAX:
+            stmt = stmt.where(t.images.c._id.not_in(list(self._in_flight)))
+        # Served newest-first straight off the partial no-AI-tags indexes
+        # (schema.ix_images_no_ai_tags / ix_images_lib_no_ai_tags), no sort.
         stmt = stmt.order_by(t.images.c._id.desc()).limit(int(limit))
         async with async_conn() as conn:
-            ids = [row._id for row in (await conn.execute(stmt)).fetchall()]
+            ids = list((await conn.execute(stmt)).scalars())
         if not ids:
             return None
         return await self.enqueue(ids=ids)
@@ -155,15 +272,13 @@ class AIJobManager:
         if not job:
             return False
 
-        # If queued, remove from queue immediately.
+        # If queued, tombstone it: the worker discards it when it comes up.
         if job.status == "queued":
-            removed = await self._queue.remove(job_id)
             job.status = "cancelled"
+            self._queue.drop()
             # Release in-flight ids.
-            ids: list[str] = getattr(job, "_ids", [])
-            for image_id in ids:
-                self._in_flight.discard(image_id)
-            return removed
+            self._in_flight.difference_update(getattr(job, "_ids", []))
+            return True
 
         # If running, request cancellation (best-effort).
         if job.status in ("running", "cancelling"):
@@ -176,106 +291,236 @@ class AIJobManager:
 
     async def _worker_loop(self) -> None:
         while True:
-            job = await self._queue.get()
-            # Job might have been cancelled before worker picked it up.
-            if job.status == "cancelled":
-                continue
-
+            job = await self._queue.get()  # never a job cancelled while queued
             job.status = "running"
             ids: list[str] = getattr(job, "_ids", [])
+            loading: asyncio.Task | None = None
             try:
                 settings = await get_ai_settings()
                 # Keep runtime idle timeout in sync
                 get_tagger_manager().set_idle_unload_s(
                     int(settings.get("idle_unload_s", 0) or 0)
                 )
+                params = _predict_params(settings)
+                # Start the model load now rather than inside the first batch:
+                # it overlaps that batch's lookup and reads, and as the tracked
+                # load the UI uses, its download progress shows in /ai/status.
+                # predict_bytes_batch's ensure_loaded joins it, not a new load.
+                get_tagger_manager().start_load(
+                    model_repo=params["model_repo"], cache_dir=params["cache_dir"]
+                )
 
-                for image_id in ids:
+                pending: list[image_tags.AIResult] = []
+                flush_at = time.monotonic() + _WRITE_INTERVAL_S
+                chunks = [
+                    ids[start : start + _PREDICT_BATCH]
+                    for start in range(0, len(ids), _PREDICT_BATCH)
+                ]
+                # Reads run one batch ahead: the next batch's lookup and file
+                # reads overlap this batch's model call, so at most one extra
+                # batch of bytes is held at a time.
+                if chunks:
+                    loading = asyncio.create_task(self._load_batch(chunks[0]))
+                for n, chunk in enumerate(chunks):
                     if job.cancel_requested:
                         job.status = "cancelled"
                         break
-                    job.current = image_id
+                    current = loading
+                    loading = (
+                        asyncio.create_task(self._load_batch(chunks[n + 1]))
+                        if n + 1 < len(chunks)
+                        else None
+                    )
+                    job.current = chunk[0]
                     try:
-                        await self._tag_one(image_id=image_id, settings=settings)
-                        job.done += 1
-                    except Exception as e:
-                        job.failed += 1
-                        job.errors.append({"image_id": image_id, "error": str(e)})
+                        outcomes = await self._tag_batch(
+                            ids=chunk, params=params, loaded=await current
+                        )
+                    except Exception as e:  # e.g. the model failed to load
+                        outcomes = [e] * len(chunk)
+                    for image_id, outcome in zip(chunk, outcomes):
+                        if isinstance(outcome, Exception):
+                            job.fail(image_id, outcome)
+                        else:
+                            pending.append(outcome)
+                    if len(pending) >= _WRITE_BATCH or time.monotonic() >= flush_at:
+                        await self._flush(job, pending)
+                        flush_at = time.monotonic() + _WRITE_INTERVAL_S
+                # Results predicted before a cancel are kept, not thrown away.
+                await self._flush(job, pending)
 
                 if job.status != "cancelled":
                     job.status = "done" if job.failed == 0 else "error"
             finally:
+                if loading is not None:  # a prefetch a cancel left unused
+                    loading.cancel()
+                    await asyncio.gather(loading, return_exceptions=True)
                 job.current = None
                 # Release in-flight ids
                 for image_id in ids:
                     self._in_flight.discard(image_id)
 
-    async def _read_image_bytes(self, file_path: str) -> bytes:
-        def _read() -> bytes:
+    @staticmethod
+    async def _flush(job: AIJob, pending: list[image_tags.AIResult]) -> None:
+        """Write the buffered results in one transaction and count them done."""
+        if not pending:
+            return
+        try:
+            await image_tags.replace_ai_many(pending)
+            job.done += len(pending)
+        except Exception as e:
+            for result in pending:
+                job.fail(result[0], e)
+        pending.clear()
+
+    async def _read_image(self, file_path: str) -> tuple[bytes, bytes]:
+        """The file's bytes and their BLAKE2b digest, both on a worker thread."""
+
+        def _read() -> tuple[bytes, bytes]:
             with open(file_path, "rb") as f:
-                return f.read()
+                data = f.read()
+            return data, hashlib.blake2b(data, digest_size=16).digest()
 
         return await asyncio.to_thread(_read)
 
-    async def _tag_one(self, *, image_id: str, settings: dict[str, Any]) -> None:
-        doc = await image_tags.find_image(image_id, {"path": 1})
-        if not doc:
-            raise RuntimeError("image not found")
-        path = doc.get("path")
-        if not path:
-            raise RuntimeError("image has no file path")
-
-        img_bytes = await self._read_image_bytes(str(path))
-
-        model_repo = str(
-            settings.get("model_repo") or DEFAULT_AI_SETTINGS["model_repo"]
+    async def _find_paths(self, ids: list[str]) -> dict[str, str | None]:
+        """Each id's file path (slash/backslash tolerant) in one query; ids with
+        no stored image are left out."""
+        stmt = sa.select(t.images.c._id, t.images.c.path).where(
+            t.ID_SLASH.in_({image_tags.slash_id(i) for i in ids})
         )
-        cache_dir = str(settings.get("cache_dir") or DEFAULT_AI_SETTINGS["cache_dir"])
-
-        result = await get_tagger_manager().predict_bytes(
-            image_bytes=img_bytes,
-            model_repo=model_repo,
-            cache_dir=cache_dir,
-            general_thresh=float(settings.get("general_thresh", 0.35)),
-            character_thresh=float(settings.get("character_thresh", 0.85)),
-            general_mcut=bool(settings.get("general_mcut", False)),
-            character_mcut=bool(settings.get("character_mcut", False)),
-            max_general=int(settings.get("max_general", 80)),
-            max_character=int(settings.get("max_character", 40)),
-        )
-
-        general_tags = [t for (t, _p) in (result.get("general_tags") or [])]
-        character_tags = [t for (t, _p) in (result.get("character_tags") or [])]
-        ai_tags = list(dict.fromkeys([*general_tags, *character_tags]))
-
-        # Pick rating with highest probability.
-        rating_map = result.get("rating") or {}
-        rating_label = "-"
-        if isinstance(rating_map, dict) and rating_map:
-            try:
-                rating_label = max(
-                    rating_map.items(), key=lambda kv: float(kv[1] or 0.0)
-                )[0]
-            except Exception:
-                rating_label = "-"
-        rating_label = image_tags.normalize_rating(str(rating_label)) or "-"
-
-        now = time.time()
-        ai_meta: dict[str, Any] = {
-            "model_repo": model_repo,
-            "caption": result.get("caption") or "",
-            "rating": result.get("rating") or {},
-            "general_tags": result.get("general_tags") or [],
-            "character_tags": result.get("character_tags") or [],
-            "general_thresh": float(settings.get("general_thresh", 0.35)),
-            "character_thresh": float(settings.get("character_thresh", 0.85)),
-            "updated_at": now,
-        }
-
-        # Replace prior AI tags with the new set, preserving manual tags.
-        await image_tags.replace_ai(
-            image_id, ai_tags=ai_tags, ai_meta=ai_meta, rating=rating_label
+        async with async_conn() as conn:
+            by_id = {row._id: row.path for row in (await conn.execute(stmt))}
+        found: dict[str, str | None] = {}
+        for image_id in ids:
+            for candidate in image_tags.id_candidates(image_id):
+                if candidate in by_id:
+                    found[image_id] = by_id[candidate]
+                    break
+        return found
+
+    async def _load_batch(
+        self, ids: list[str]
+    ) -> dict[str, tuple[bytes, bytes] | Exception]:
+        """Each id's file bytes and digest, or why it can't be read: the I/O
+        half of a batch, which the worker runs ahead of the model."""
+        paths = await self._find_paths(ids)
+        loaded: dict[str, tuple[bytes, bytes] | Exception] = {}
+        for image_id in ids:
+            if image_id not in paths:
+                loaded[image_id] = RuntimeError("image not found")
+            elif not paths[image_id]:
+                loaded[image_id] = RuntimeError("image has no file path")
+        todo = [i for i in ids if i not in loaded]
+        reads = await asyncio.gather(
+            *(self._read_image(str(paths[i])) for i in todo),
+            return_exceptions=True,
         )
+        loaded.update(zip(todo, reads))
+        return loaded
+
+    async def _tag_batch(
+        self,
+        *,
+        ids: list[str],
+        params: dict[str, Any],
+        loaded: dict[str, tuple[bytes, bytes] | Exception] | None = None,
+    ) -> list[image_tags.AIResult | Exception]:
+        """Predict tags for a batch of images; one outcome per id, in order —
+        the result, or why that image failed. ``loaded`` is the batch's
+        :meth:`_load_batch` when already fetched. Writes are left to the caller."""
+        if loaded is None:
+            loaded = await self._load_batch(ids)
+        outcomes: dict[str, image_tags.AIResult | Exception] = {}
+        digests: dict[str, bytes] = {}
+        preds: dict[bytes, dict[str, Any] | Exception] = {}  # by content digest
+        to_predict: dict[bytes, bytes] = {}  # digest -> bytes, once per content
+        cache = self._predictions
+        key_params = tuple(params.items())
+        for image_id in ids:
+            got = loaded[image_id]
+            if isinstance(got, Exception):
+                outcomes[image_id] = got
+                continue
+            data, digest = got
+            digests[image_id] = digest
+            hit = cache.get((digest, key_params))
+            if hit is not None:
+                cache.move_to_end((digest, key_params))
+                preds[digest] = hit
+            else:
+                to_predict.setdefault(digest, data)
+
+        if to_predict:
+            fresh = await get_tagger_manager().predict_bytes_batch(
+                list(to_predict.values()), **params
+            )
+            for digest, pred in zip(to_predict, fresh):
+                preds[digest] = pred
+                if not isinstance(pred, Exception):
+                    cache[(digest, key_params)] = pred
+            while len(cache) > _PREDICTION_CACHE_SIZE:
+                cache.popitem(last=False)
+        for image_id, digest in digests.items():
+            pred = preds[digest]
+            outcomes[image_id] = (
+                pred
+                if isinstance(pred, Exception)
+                else _ai_result(image_id, pred, params)
+            )
+        return [outcomes[i] for i in ids]
+
+
+def _predict_params(settings: Mapping[str, Any]) -> dict[str, Any]:
+    """The model target and thresholds from ``settings``, coerced once per job:
+    the keyword arguments of ``TaggerManager.predict_bytes_batch``."""
+    return {
+        "model_repo": str(
+            settings.get("model_repo") or DEFAULT_AI_SETTINGS["model_repo"]
+        ),
+        # Resolved like the API's model routes, so a job and a UI-started load
+        # name the same target (and share one load and download).
+        "cache_dir": str(
+            app_settings.resolve_cache_dir(
+                str(settings.get("cache_dir") or DEFAULT_AI_SETTINGS["cache_dir"])
+            )
+        ),
+        "general_thresh": float(settings.get("general_thresh", 0.35)),
+        "character_thresh": float(settings.get("character_thresh", 0.85)),
+        "general_mcut": bool(settings.get("general_mcut", False)),
+        "character_mcut": bool(settings.get("character_mcut", False)),
+        "max_general": int(settings.get("max_general", 80)),
+        "max_character": int(settings.get("max_character", 40)),
+    }
+
+
+def _ai_result(
+    image_id: str, result: dict[str, Any], params: dict[str, Any]
+) -> image_tags.AIResult:
+    """The tag write for one prediction: AI tags, ``ai`` metadata and rating."""
+    general_tags = [t for (t, _p) in (result.get("general_tags") or [])]
+    character_tags = [t for (t, _p) in (result.get("character_tags") or [])]
+    ai_tags = list(dict.fromkeys([*general_tags, *character_tags]))
+
+    # Pick rating with highest probability (select_tags emits float scores).
+    rating_map = result.get("rating") or {}
+    rating_label = max(rating_map, key=rating_map.__getitem__) if rating_map else "-"
+    rating_label = image_tags.normalize_rating(str(rating_label)) or "-"
+
+    now = time.time()
+    ai_meta: dict[str, Any] = {
+        "model_repo": params["model_repo"],
+        "caption": result.get("caption") or "",
+        "rating": result.get("rating") or {},
+        "general_tags": result.get("general_tags") or [],
+        "character_tags": result.get("character_tags") or [],
+        "general_thresh": params["general_thresh"],
+        "character_thresh": params["character_thresh"],
+        "updated_at": now,
+    }
+
+    # Replaces prior AI tags with the new set, preserving manual tags.
+    return (image_id, ai_tags, ai_meta, rating_label)
 
 
 _ai_job_manager: AIJobManager | None = None
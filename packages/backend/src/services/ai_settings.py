@@ -6,6 +6,8 @@ Kept separate from the job manager so the validation/clamping rules
 
 from __future__ import annotations
 
+import time
+from collections.abc import Mapping
 from typing import Any
 
 import sqlalchemy as sa
@@ -32,6 +34,22 @@ DEFAULT_AI_SETTINGS: dict[str, Any] = {
 }
 
 
+# `/ai/status` is polled every second or two and every poll reads settings; a
+# short TTL collapses those reads. The merged dict is built once per miss and
+# handed out as-is (typed read-only), not copied per call. Writes go through
+# `update_ai_settings`, which refreshes the cache, so in-process staleness is
+# bounded to direct DB edits. The TTL stays short because it is also the
+# cross-worker staleness bound, and a miss is one primary-key read of a local
+# row. Aged on the monotonic clock, so a wall-clock step can't pin an entry.
+_SETTINGS_CACHE: tuple[float, dict[str, Any]] | None = None
+_SETTINGS_TTL_SECONDS = 1.0
+
+
+def invalidate_settings_cache() -> None:
+    global _SETTINGS_CACHE
+    _SETTINGS_CACHE = None
+
+
 def clean_settings_patch(patch: dict[str, Any]) -> dict[str, Any]:
     """Drop unknown keys and coerce/clamp known ones. Pure; no I/O.
 
@@ -76,7 +94,15 @@ async def _read_ai_doc() -> dict[str, Any] | None:
         ).scalar()
 
 
-async def get_ai_settings() -> dict[str, Any]:
+async def get_ai_settings() -> Mapping[str, Any]:
+    """The effective settings: the stored overrides over the defaults. Shared
+    with the cache, so treat as read-only; ``dict(...)`` it to modify."""
+    global _SETTINGS_CACHE
+    now = time.monotonic()
+    cached = _SETTINGS_CACHE
+    if cached and (now - cached[0]) < _SETTINGS_TTL_SECONDS:
+        return cached[1]
+
     doc = await _read_ai_doc()
     if doc is None:
         async with async_tx() as conn:
@@ -85,24 +111,33 @@ async def get_ai_settings() -> dict[str, Any]:
                 .values(_id="ai", doc=dict(DEFAULT_AI_SETTINGS))
                 .on_conflict_do_nothing(index_elements=[t.app_settings.c._id])
             )
-        return dict(DEFAULT_AI_SETTINGS)
-    return {**DEFAULT_AI_SETTINGS, **doc}
+        merged = dict(DEFAULT_AI_SETTINGS)
+    else:
+        merged = {**DEFAULT_AI_SETTINGS, **doc}
+    _SETTINGS_CACHE = (now, merged)
+    return merged
 
 
-async def update_ai_settings(patch: dict[str, Any]) -> dict[str, Any]:
+async def update_ai_settings(patch: dict[str, Any]) -> Mapping[str, Any]:
     clean = clean_settings_patch(patch)
 
-    existing = await _read_ai_doc() or {}
-    new_doc = {**existing, **clean}
+    # Merge just the changed keys into the stored doc inside the upsert
+    # (json_patch), rather than reading the doc and writing all of it back:
+    # one statement, and no window for a concurrent update to be overwritten.
+    # RETURNING hands back the merged doc, so nothing is read again after.
+    global _SETTINGS_CACHE
     async with async_tx() as conn:
-        stmt = sqlite_insert(t.app_settings).values(_id="ai", doc=new_doc)
+        stmt = sqlite_insert(t.app_settings).values(_id="ai", doc=clean)
         stmt = stmt.on_conflict_do_update(
-            index_elements=[t.app_settings.c._id], set_={"doc": stmt.excluded.doc}
-        )
-        await conn.execute(stmt)
+            index_elements=[t.app_settings.c._id],
+            set_={"doc": sa.func.json_patch(t.app_settings.c.doc, stmt.excluded.doc)},
+        ).returning(t.app_settings.c.doc)
+        doc = (await conn.execute(stmt)).scalar_one()
+    merged = {**DEFAULT_AI_SETTINGS, **doc}
+    _SETTINGS_CACHE = (time.monotonic(), merged)
 
     # Apply runtime knobs immediately.
     if "idle_unload_s" in clean:
         get_tagger_manager().set_idle_unload_s(int(clean["idle_unload_s"]))
 
-    return await get_ai_settings()
+    return merged
@@ -2,8 +2,11 @@ from __future__ import annotations
 
 import asyncio
 import csv
+import os
 import time
-from dataclasses import dataclass
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from functools import lru_cache
 from io import BytesIO
 from typing import Any
 
@@ -44,6 +47,14 @@ KAOMOJIS = {
     "||_||",
 }
 
+# ONNX Runtime execution providers in order of preference.
+_PROVIDERS = (
+    "CUDAExecutionProvider",
+    "DnnlExecutionProvider",
+    "OpenVINOExecutionProvider",
+    "CPUExecutionProvider",
+)
+
 
 def mcut_threshold(probs: np.ndarray) -> float:
     """Compute the MCUT threshold.
@@ -69,9 +80,27 @@ class LabelIndex:
     rating_idx: np.ndarray
     general_idx: np.ndarray
     character_idx: np.ndarray
+    # Names per category, aligned with the *_idx arrays, so select_tags can
+    # index them with the same masks it applies to the scores.
+    rating_names: np.ndarray = field(init=False, repr=False)
+    general_names: np.ndarray = field(init=False, repr=False)
+    character_names: np.ndarray = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        names = np.asarray(self.names, dtype=object)
+        for cat in ("rating", "general", "character"):
+            object.__setattr__(self, f"{cat}_names", names[getattr(self, f"{cat}_idx")])
 
 
 def _load_labels_from_csv(csv_path: str) -> LabelIndex:
+    """The label index for ``csv_path``, parsed once per version of the file:
+    reloading a model (a repo switch back, an idle unload) reuses it."""
+    st = os.stat(csv_path)
+    return _parse_labels(csv_path, st.st_mtime_ns, st.st_size)
+
+
+@lru_cache(maxsize=4)
+def _parse_labels(csv_path: str, _mtime_ns: int, _size: int) -> LabelIndex:
     names: list[str] = []
     categories: list[int] = []
 
@@ -106,6 +135,18 @@ def _load_labels_from_csv(csv_path: str) -> LabelIndex:
     )
 
 
+def _top(
+    names: np.ndarray, scores: np.ndarray, thresh: float, cap: int
+) -> list[tuple[str, float]]:
+    """``(name, score)`` for scores above ``thresh``, highest first (ties keep
+    label order), at most ``cap`` of them when ``cap > 0``."""
+    keep = np.flatnonzero(scores > thresh)
+    keep = keep[np.argsort(-scores[keep], kind="stable")]
+    if cap > 0:
+        keep = keep[: int(cap)]
+    return list(zip(names[keep].tolist(), scores[keep].tolist()))
+
+
 def select_tags(
     labels: LabelIndex,
     preds: np.ndarray,
@@ -123,27 +164,17 @@ def select_tags(
     ONNX session so the tagging logic can be unit-tested with a fake ``preds``
     array and a small :class:`LabelIndex` — no onnxruntime required.
     """
-    scored = list(zip(labels.names, preds.astype(float)))
-
-    rating = dict(scored[i] for i in labels.rating_idx)
-
-    general = [scored[i] for i in labels.general_idx]
-    if general_mcut and general:
-        general_thresh = mcut_threshold(np.array([p for _, p in general]))
-    general = [(t, p) for (t, p) in general if p > general_thresh]
-    general.sort(key=lambda x: x[1], reverse=True)
-    if max_general > 0:
-        general = general[: int(max_general)]
-
-    character = [scored[i] for i in labels.character_idx]
-    if character_mcut and character:
-        character_thresh = max(
-            0.15, mcut_threshold(np.array([p for _, p in character]))
-        )
-    character = [(t, p) for (t, p) in character if p > character_thresh]
-    character.sort(key=lambda x: x[1], reverse=True)
-    if max_character > 0:
-        character = character[: int(max_character)]
+    rating = dict(zip(labels.rating_names.tolist(), preds[labels.rating_idx].tolist()))
+
+    scores = preds[labels.general_idx].astype(np.float64)
+    if general_mcut and len(scores):
+        general_thresh = mcut_threshold(scores)
+    general = _top(labels.general_names, scores, general_thresh, max_general)
+
+    scores = preds[labels.character_idx].astype(np.float64)
+    if character_mcut and len(scores):
+        character_thresh = max(0.15, mcut_threshold(scores))
+    character = _top(labels.character_names, scores, character_thresh, max_character)
 
     caption = ", ".join([t for t, _ in general])
 
@@ -155,6 +186,126 @@ def select_tags(
     }
 
 
+def prepare_image(img: Image.Image, target_size: int | None) -> np.ndarray:
+    """One image as a ``(1, S, S, 3)`` BGR float32 model input: alpha flattened
+    onto white, padded to a centred square, resized to ``target_size`` (or kept
+    at its own size when the model's input size is dynamic)."""
+    # Alpha flattening and padding in one pass: paste straight into the white
+    # square, with alpha as the mask only when the image carries any.
+    if img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info:
+        img = img.convert("RGBA")
+        mask = img.getchannel("A")
+    else:
+        img = img.convert("RGB")
+        mask = None
+
+    w, h = img.size
+    m = max(w, h)
+    pad = Image.new("RGB", (m, m), (255, 255, 255))
+    pad.paste(img, ((m - w) // 2, (m - h) // 2), mask)
+
+    target = target_size if target_size is not None else m
+    if m != target:
+        resample = getattr(getattr(Image, "Resampling", Image), "BICUBIC", 3)
+        pad = pad.resize((int(target), int(target)), resample)
+
+    # RGB -> BGR on the uint8 view; float32 only for the final copy.
+    return np.asarray(pad)[None, :, :, ::-1].astype(np.float32)
+
+
+def decode_and_prepare(image_bytes: bytes, target_size: int | None) -> np.ndarray:
+    """Decode an encoded image and :func:`prepare_image` it. Pure CPU work that
+    Pillow runs mostly outside the GIL, so callers fan it out to threads."""
+    img = Image.open(BytesIO(image_bytes))
+    if target_size is not None:
+        # Like the thumbnailer: a JPEG decodes at 1/2-1/8 scale when its long
+        # side still covers target_size, since prepare_image only downsamples
+        # it further. No-op for other formats.
+        w, h = img.size
+        m = max(w, h, 1)
+        img.draft("RGB", (max(1, w * target_size // m), max(1, h * target_size // m)))
+    return prepare_image(img, target_size)
+
+
+def _quantized_int8(onnx_path: str) -> str:
+    """Path of ``onnx_path``'s dynamic INT8 copy, (re)built when missing or
+    older than the model it comes from."""
+    out = onnx_path.removesuffix(".onnx") + ".int8.onnx"
+    if os.path.exists(out) and os.path.getmtime(out) >= os.path.getmtime(onnx_path):
+        return out
+    try:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except ImportError as e:
+        raise RuntimeError(
+            "ai_quantize=int8 needs the 'onnx' package. Install it or set "
+            "ai_quantize=off."
+        ) from e
+    tmp = out.removesuffix(".onnx") + ".part.onnx"
+    quantize_dynamic(onnx_path, tmp, weight_type=QuantType.QInt8)
+    os.replace(tmp, out)
+    return out
+
+
+@dataclass(frozen=True)
+class LoadedModel:
+    """A loaded tagger model's session, labels and input size, captured together
+    so a run on a worker thread can't see half of an unload or a model swap."""
+
+    session: Any
+    labels: LabelIndex
+    target_size: int | None
+
+
+def predict_tensors(
+    model: LoadedModel,
+    tensors: list[np.ndarray],
+    *,
+    general_thresh: float,
+    character_thresh: float,
+    general_mcut: bool = False,
+    character_mcut: bool = False,
+    max_general: int = 80,
+    max_character: int = 40,
+) -> list[dict[str, Any]]:
+    """Tag already-prepared inputs (see :func:`prepare_image`, sized for
+    ``model.target_size``) in one ``session.run``.
+
+    The inputs are stacked along the batch axis, so graph dispatch is paid
+    once per batch rather than per image. A model without a fixed input size
+    pads each image to its own square, which can't be stacked: those run
+    one at a time.
+
+    Uses only ``model``, never the tagger's current state, so it runs safely on
+    a worker thread: an unload or swap meanwhile doesn't affect this run.
+    """
+    session = model.session
+    input_name = session.get_inputs()[0].name
+    output_name = session.get_outputs()[0].name
+    if model.target_size is not None:
+        batches = [np.concatenate(tensors, axis=0)] if tensors else []
+    else:
+        batches = tensors
+    preds = [
+        row
+        for batch in batches
+        for row in session.run([output_name], {input_name: batch})[0]
+    ]
+
+    return [
+        select_tags(
+            model.labels,
+            row,
+            general_thresh=general_thresh,
+            character_thresh=character_thresh,
+            general_mcut=general_mcut,
+            character_mcut=character_mcut,
+            max_general=max_general,
+            max_character=max_character,
+        )
+        for row in preds
+    ]
+
+
 class WDTagger:
     def __init__(self) -> None:
         self._session: Any | None = None
@@ -170,6 +321,10 @@ class WDTagger:
     def loaded(self) -> bool:
         return self._session is not None
 
+    @property
+    def target_size(self) -> int | None:
+        return self._target_size
+
     def unload(self) -> None:
         # Best-effort: drop references so Python can GC.
         self._session = None
@@ -188,13 +343,25 @@ class WDTagger:
 
         csv_path, onnx_path = await download_wd_tagger(model_repo, cache_dir=cache_dir)
         labels = await asyncio.to_thread(_load_labels_from_csv, csv_path)
+        if app_settings.ai_quantize == "int8":
+            onnx_path = await asyncio.to_thread(_quantized_int8, onnx_path)
 
         # Import locally so type checkers don't treat rt as Optional.
         import onnxruntime as ort
 
         def _make_session():
-            # CPU first is the most portable; GPU provider can be added later.
-            return ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+            so = ort.SessionOptions()
+            # Full graph fusion (Conv+BN+activation etc.), done once at load.
+            so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            so.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+            so.enable_cpu_mem_arena = True
+            so.enable_mem_pattern = True
+            so.intra_op_num_threads = max(0, app_settings.ai_intra_op_threads)
+            # Accelerated providers when this onnxruntime build has them; CPU
+            # is always last, and always available.
+            available = set(ort.get_available_providers())
+            providers = [p for p in _PROVIDERS if p in available]
+            return ort.InferenceSession(onnx_path, sess_options=so, providers=providers)
 
         session = await asyncio.to_thread(_make_session)
 
@@ -207,55 +374,24 @@ class WDTagger:
         self._target_size = target_size
         self._repo = model_repo
 
-    def _prepare_image(self, img: Image.Image) -> np.ndarray:
-        # Convert to RGB with white background for alpha
-        canvas = Image.new("RGBA", img.size, (255, 255, 255, 255))
-        canvas.alpha_composite(img.convert("RGBA"))
-        img = canvas.convert("RGB")
-
-        w, h = img.size
-        m = max(w, h)
-        pad = Image.new("RGB", (m, m), (255, 255, 255))
-        pad.paste(img, ((m - w) // 2, (m - h) // 2))
-
-        target = self._target_size if self._target_size is not None else m
-        if m != target:
-            resample = getattr(getattr(Image, "Resampling", Image), "BICUBIC", 3)
-            pad = pad.resize((int(target), int(target)), resample)
-
-        arr = np.asarray(pad, dtype=np.float32)[:, :, ::-1]  # RGB -> BGR
-        return arr[None, ...]
-
-    def predict(
-        self,
-        *,
-        image: Image.Image,
-        general_thresh: float,
-        character_thresh: float,
-        general_mcut: bool = False,
-        character_mcut: bool = False,
-        max_general: int = 80,
-        max_character: int = 40,
-    ) -> dict[str, Any]:
-        assert self._session is not None and self._labels is not None
-
-        input_tensor = self._prepare_image(image)
-        input_name = self._session.get_inputs()[0].name
-        output_name = self._session.get_outputs()[0].name
+    def predict(self, *, image: Image.Image, **params: Any) -> dict[str, Any]:
+        return self.predict_batch([image], **params)[0]
 
-        preds = self._session.run([output_name], {input_name: input_tensor})[0][0]
-
-        return select_tags(
-            self._labels,
-            preds,
-            general_thresh=general_thresh,
-            character_thresh=character_thresh,
-            general_mcut=general_mcut,
-            character_mcut=character_mcut,
-            max_general=max_general,
-            max_character=max_character,
+    def predict_batch(
+        self, images: list[Image.Image], **params: Any
+    ) -> list[dict[str, Any]]:
+        """:meth:`predict` for several images in one model call."""
+        model = self.model()
+        return predict_tensors(
+            model, [prepare_image(img, model.target_size) for img in images], **params
         )
 
+    def model(self) -> LoadedModel:
+        """The loaded model's state, read in one go. Raises if none is loaded."""
+        if self._session is None or self._labels is None:
+            raise RuntimeError("tagger model is not loaded")
+        return LoadedModel(self._session, self._labels, self._target_size)
+
 
 class TaggerManager:
     """Process-level tagger manager with idle-unload."""
@@ -278,6 +414,10 @@ class TaggerManager:
             "idle_unload_s": self._idle_unload_s,
         }
 
+    def snapshot(self) -> dict[str, Any]:
+        """``status()`` + ``load_status()`` under the keys the API serves."""
+        return {"model": self.status(), "model_load": self.load_status()}
+
     def load_status(self) -> dict[str, Any]:
         repo = self._loading_for[0] if self._loading_for else self._tagger.repo
         cache_dir = self._loading_for[1] if self._loading_for else None
@@ -426,21 +566,72 @@ class TaggerManager:
         max_general: int,
         max_character: int,
     ) -> dict[str, Any]:
+        # One image is a batch of one: the same off-loop decode and single
+        # model call. Inference has a single consumer (the job worker), which
+        # already submits stacked batches, so there is nothing to coalesce.
+        (out,) = await self.predict_bytes_batch(
+            [image_bytes],
+            model_repo=model_repo,
+            cache_dir=cache_dir,
+            general_thresh=general_thresh,
+            character_thresh=character_thresh,
+            general_mcut=general_mcut,
+            character_mcut=character_mcut,
+            max_general=max_general,
+            max_character=max_character,
+        )
+        if isinstance(out, Exception):
+            raise out
+        return out
+
+    async def predict_bytes_batch(
+        self,
+        images: list[bytes],
+        *,
+        model_repo: str,
+        cache_dir: str,
+        **params: Any,
+    ) -> list[dict[str, Any] | Exception]:
+        """:meth:`predict_bytes` for many images in one model call. Returns one
+        entry per input, in order: the prediction, or the exception that image
+        failed to decode with (a bad file doesn't sink its batch).
+
+        Decoding and preprocessing run on worker threads, one per image, so
+        they neither block the event loop nor queue behind each other.
+        """
         await self.ensure_loaded(model_repo=model_repo, cache_dir=cache_dir)
-        async with self._lock:
-            # Lock ensures session use is serialized (safe baseline).
-            # We can relax later with per-session locks or multiple sessions.
+        # One snapshot for decode sizing and the run, taken on the loop right
+        # after the load, so both match the same model whatever happens next.
+        model = self._tagger.model()
+        prepared = await asyncio.gather(
+            *(
+                asyncio.to_thread(decode_and_prepare, b, model.target_size)
+                for b in images
+            ),
+            return_exceptions=True,
+        )
+        out: list[dict[str, Any] | Exception] = []
+        tensors: dict[int, np.ndarray] = {}  # slot in ``out`` -> model input
+        for slot, got in enumerate(prepared):
+            if isinstance(got, np.ndarray):
+                tensors[slot] = got
+                out.append({})
+            elif isinstance(got, Exception):
+                out.append(got)
+            else:  # cancellation: not a per-image failure
+                raise got
+        if tensors:
+            # Off the event loop and outside the lock: onnxruntime's run is
+            # thread-safe and releases the GIL, and the run holds its own
+            # snapshot, so a load/unload meanwhile doesn't change what it uses.
             self._last_used = time.time()
-            img = Image.open(BytesIO(image_bytes)).convert("RGBA")
-            return self._tagger.predict(
-                image=img,
-                general_thresh=general_thresh,
-                character_thresh=character_thresh,
-                general_mcut=general_mcut,
-                character_mcut=character_mcut,
-                max_general=max_general,
-                max_character=max_character,
+            preds = await asyncio.to_thread(
+                predict_tensors, model, list(tensors.values()), **params
             )
+            self._last_used = time.time()
+            for slot, pred in zip(tensors, preds):
+                out[slot] = pred
+        return out
 
     async def idle_unload_loop(self, *, poll_s: float = 5.0) -> None:
         while True:
@@ -467,16 +658,14 @@ def get_tagger_manager() -> TaggerManager:
     return _tagger_manager
 
 
-def model_status_view(settings: dict[str, Any]) -> dict[str, Any]:
+def model_status_view(settings: Mapping[str, Any]) -> dict[str, Any]:
     """The assembled model status the API serves: live tagger state, load state,
     and the download state for the settings' target. One place stitches the two
     managers together so routes don't reach into either's internals."""
     repo, cache_dir = model_target(settings)
     cache_dir = str(app_settings.resolve_cache_dir(cache_dir))
-    mgr = get_tagger_manager()
     return {
-        "model": mgr.status(),
-        "model_load": mgr.load_status(),
+        **get_tagger_manager().snapshot(),
         "model_download": get_download_manager()
         .get_state(model_repo=repo, cache_dir=cache_dir)
         .as_dict(),
@@ -12,6 +12,7 @@ from __future__ import annotations
 import asyncio
 import os
 import time
+from collections.abc import Mapping
 from dataclasses import dataclass, field
 from typing import Any
 
@@ -22,8 +23,12 @@ import httpx
 # ai_tagger (which would create a cycle).
 DEFAULT_CACHE_DIR = ".cache/tagify/models"
 
+# Read size for streamed downloads. The model is hundreds of MB, so bigger
+# reads mean far fewer loop iterations, awaits and progress updates.
+_CHUNK_SIZE = 1024 * 1024
 
-def model_target(settings: dict[str, Any]) -> tuple[str, str]:
+
+def model_target(settings: Mapping[str, Any]) -> tuple[str, str]:
     """Resolve ``(model_repo, cache_dir)`` from a settings dict, applying the
     default cache dir. The single place the cache-dir fallback is spelled."""
     repo = str(settings.get("model_repo") or "")
@@ -38,21 +43,6 @@ def _get_hf_endpoint() -> str:
     return hf_endpoint.rstrip("/")
 
 
-async def _download_if_missing(url: str, dst_path: str) -> None:
-    # Back-compat helper: keep simple behavior for any other callers.
-    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
-    if os.path.exists(dst_path):
-        return
-
-    async with httpx.AsyncClient(timeout=60.0, follow_redirects=True) as client:
-        async with client.stream("GET", url) as r:
-            r.raise_for_status()
-            with open(dst_path, "wb") as f:
-                async for chunk in r.aiter_bytes(chunk_size=1024 * 256):
-                    if chunk:
-                        f.write(chunk)
-
-
 @dataclass
 class DownloadFileState:
     name: str
@@ -222,19 +212,33 @@ class ModelDownloadManager:
         ]
         st.files = files
 
+        # One client for the run (one pool for the host). Files download
+        # concurrently: neither waits on the other's transfer.
+        todo: list[DownloadFileState] = []
         for f in files:
             if st.cancel_requested:
                 f.status = "cancelled"
-                continue
-            if os.path.exists(f.dst_path):
+            elif os.path.exists(f.dst_path):
                 f.status = "done"
                 f.downloaded = os.path.getsize(f.dst_path)
                 f.total = f.downloaded
                 st.updated_at = time.time()
-                continue
-            await self._download_one(st, f)
-
-    async def _download_one(self, st: ModelDownloadState, f: DownloadFileState) -> None:
+            else:
+                todo.append(f)
+        if not todo:
+            return
+        async with httpx.AsyncClient(timeout=None, follow_redirects=True) as client:
+            try:
+                async with asyncio.TaskGroup() as tg:
+                    for f in todo:
+                        tg.create_task(self._download_one(client, st, f))
+            except ExceptionGroup as eg:
+                # The first failure cancelled the rest; report it, not the group.
+                raise eg.exceptions[0] from None
+
+    async def _download_one(
+        self, client: httpx.AsyncClient, st: ModelDownloadState, f: DownloadFileState
+    ) -> None:
         os.makedirs(os.path.dirname(f.dst_path), exist_ok=True)
         tmp_path = f.dst_path + ".part"
 
@@ -253,24 +257,23 @@ class ModelDownloadManager:
         st.updated_at = time.time()
 
         try:
-            async with httpx.AsyncClient(timeout=None, follow_redirects=True) as client:
-                async with client.stream("GET", f.url) as r:
-                    r.raise_for_status()
-                    try:
-                        cl = r.headers.get("Content-Length")
-                        f.total = int(cl) if cl else None
-                    except Exception:
-                        f.total = None
-
-                    with open(tmp_path, "wb") as out:
-                        async for chunk in r.aiter_bytes(chunk_size=1024 * 256):
-                            if st.cancel_requested:
-                                raise asyncio.CancelledError()
-                            if not chunk:
-                                continue
-                            out.write(chunk)
-                            f.downloaded += len(chunk)
-                            st.updated_at = time.time()
+            async with client.stream("GET", f.url) as r:
+                r.raise_for_status()
+                try:
+                    cl = r.headers.get("Content-Length")
+                    f.total = int(cl) if cl else None
+                except Exception:
+                    f.total = None
+
+                with open(tmp_path, "wb") as out:
+                    async for chunk in r.aiter_bytes(chunk_size=_CHUNK_SIZE):
+                        if st.cancel_requested:
+                            raise asyncio.CancelledError()
+                        if not chunk:
+                            continue
+                        out.write(chunk)
+                        f.downloaded += len(chunk)
+                        st.updated_at = time.time()
 
             # Atomic replace
             os.replace(tmp_path, f.dst_path)
@@ -27,15 +27,16 @@ class FeedFilterError(ValueError):
     """Invalid feed-filter input. The router maps this to HTTP 422."""
 
 
-# Columns the grid needs (kept minimal for payload size).
+# Columns the grid needs (kept minimal for payload size). No thumb_key: the
+# router derives the thumb URL from `_id`, versioned by `mtime` (which it pops).
 FEED_COLUMNS = (
     t.images.c._id,
     t.images.c.path,
     t.images.c.width,
     t.images.c.height,
-    t.images.c.thumb_key,
     t.images.c.blurhash,
     t.images.c.score,
+    t.images.c.mtime,
 )
 
 
@@ -170,10 +171,16 @@ async def list_feed(
     return [dict(r._mapping) for r in rows]
 
 
-async def list_groups(f: FeedFilter, *, offset: int, limit: int) -> list[dict]:
+async def list_groups(
+    f: FeedFilter, *, limit: int, offset: int = 0, cursor: str | None = None
+) -> list[dict]:
     """Batch-collapsed view: images sharing a ``gen_group_id`` fold into one entry
     (newest member is the representative, plus a count). Ungrouped images stand
-    alone. Grouping is a full aggregation, so it spans page boundaries."""
+    alone. Grouping is a full aggregation, so it spans page boundaries.
+
+    Each group appears once, keyed by its representative's ``_id``, so the view
+    pages by ``_id < cursor`` exactly like the feed; ``offset`` is the legacy
+    fallback when no cursor is given."""
     # Ungrouped images key on their own _id so each stands alone (never a single
     # giant "null" bucket). Window functions count + pick the representative in
     # one pass, spanning page boundaries.
@@ -190,28 +197,13 @@ async def list_groups(f: FeedFilter, *, offset: int, limit: int) -> list[dict]:
         .where(feed_where(f))
         .subquery()
     )
-    stmt = (
-        sa.select(sub)
-        .where(sub.c.rn == 1)
-        .order_by(sub.c._id.desc())
-        .offset(offset)
-        .limit(limit)
-    )
+    # Everything but the rank, so rows map straight onto the response shape.
+    stmt = sa.select(*(c for c in sub.c if c.name != "rn")).where(sub.c.rn == 1)
+    if cursor:
+        stmt = stmt.where(sub.c._id < cursor)
+    stmt = stmt.order_by(sub.c._id.desc()).limit(limit)
+    if not cursor and offset:
+        stmt = stmt.offset(offset)
     async with async_conn() as conn:
         rows = (await conn.execute(stmt)).fetchall()
-    out = []
-    for r in rows:
-        out.append(
-            {
-                "_id": r._id,
-                "path": r.path,
-                "width": r.width,
-                "height": r.height,
-                "thumb_key": r.thumb_key,
-                "blurhash": r.blurhash,
-                "score": r.score,
-                "group_id": r.group_id,
-                "group_count": r.group_count,
-            }
-        )
-    return out
+    return [dict(r._mapping) for r in rows]
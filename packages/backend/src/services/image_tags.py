@@ -14,22 +14,26 @@ Conventions enforced here (and nowhere else):
 - ``rating``          — one of RATINGS; reset to ``"-"`` when AI tags are cleared.
 
 Every write recomputes the three flags from the resulting array
-(:func:`recompute_flags`) and rebuilds this image's rows in the derived
-``image_tags`` join table — all inside one transaction, so the booleans and the
-index table can never drift from the array they summarise. Callers hand the repo a
-high-level intent (apply manual / remove / replace AI / clear AI / replace prompt);
-they never assemble SQL.
+(:func:`recompute_flags`) and moves this image's rows in the derived
+``image_tags`` join table from the old array to the new one — all inside one
+transaction, so the booleans and the index table can never drift from the array
+they summarise. Any join-row change also bumps the shared tag-data version
+(:func:`tags_version`) in the same transaction, so every worker's tag-listing
+cache sees it. Callers hand the repo a high-level intent (apply manual / remove /
+replace AI / clear AI / replace prompt); they never assemble SQL.
 """
 
 from __future__ import annotations
 
-from typing import Any, Callable
+import uuid
+from typing import Any, Callable, Iterable
 
 import sqlalchemy as sa
 from sqlalchemy import Connection
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncConnection
 
-from ..database.db import async_conn, async_tx
+from ..database.db import async_conn, async_tx, sync_conn
 from ..database import schema as t
 
 MANUAL_PREFIX = "manual:"
@@ -63,6 +67,12 @@ def to_manual(tag: str) -> str:
     return tag if is_manual(tag) else f"{MANUAL_PREFIX}{tag}"
 
 
+def to_manual_all(tags: Iterable[str]) -> list[str]:
+    """:func:`to_manual` over ``tags``, de-duplicated in first-seen order —
+    ``cat`` and ``manual:cat`` collapse to one entry before any DB work."""
+    return list(dict.fromkeys(map(to_manual, tags)))
+
+
 def is_prompt(tag: str) -> bool:
     return tag.startswith(PROMPT_PREFIX)
 
@@ -136,6 +146,24 @@ def excluded_prefixes(*, include_manual: bool, include_prompt: bool) -> list[str
     return excluded
 
 
+def kept_tag_ranges(excluded: Iterable[str]) -> list[tuple[str | None, str | None]]:
+    """Half-open ``[lo, hi)`` tag ranges (``None`` = unbounded) that skip every
+    ``excluded`` prefix.
+
+    Tags under one prefix are contiguous in binary order, ending just before the
+    prefix with its last character bumped (``manual:`` -> ``manual;``), so the
+    kept tags are the gaps between those spans. Each gap is one index range
+    seek, and the excluded tags are never read at all.
+    """
+    ranges: list[tuple[str | None, str | None]] = []
+    lo: str | None = None
+    for prefix in sorted(excluded):
+        ranges.append((lo, prefix))
+        lo = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    ranges.append((lo, None))
+    return ranges
+
+
 def normalize_rating(raw: str | None) -> str | None:
     """Map a raw rating label to the canonical vocabulary.
 
@@ -176,6 +204,28 @@ def id_candidates(image_id: str) -> list[str]:
     return [image_id, *id_variants(image_id)]
 
 
+def slash_id(image_id: str) -> str:
+    """``image_id`` with ``\\`` folded to ``/`` — the key of ``t.ID_SLASH``.
+
+    Every spelling from :func:`id_candidates` folds to this value, so one
+    indexed equality fetches them all; :func:`first_candidate` then picks the
+    primary-first match if more than one is stored.
+    """
+    return image_id.replace("\\", "/")
+
+
+def first_candidate(rows: Iterable[Any], candidates: list[str]) -> Any | None:
+    """Of ``rows`` fetched with ``_id IN candidates``, the one for the earliest
+    candidate. Lets a lookup resolve every spelling in one query while keeping
+    the primary-first order of :func:`id_candidates`."""
+    by_id = {row._id: row for row in rows}
+    for candidate in candidates:
+        row = by_id.get(candidate)
+        if row is not None:
+            return row
+    return None
+
+
 # --- Tag-set transforms (pure) ------------------------------------------------
 #
 # Replace the old Mongo aggregation-pipeline updates. Each takes the current tag
@@ -254,68 +304,214 @@ def row_to_doc(row: Any) -> dict[str, Any]:
     doc = dict(row._mapping)
     for helper in ("gen_model", "gen_workflow_sig", "gen_group_id", "gen_prompt"):
         doc.pop(helper, None)
-    if doc.get("tags") is None:
+    if "tags" in doc and doc["tags"] is None:
         doc["tags"] = []
     return doc
 
 
+def _join_delta(
+    image_id: str, old_tags: list[str], new_tags: list[str]
+) -> tuple[list[str], list[dict[str, str]]]:
+    """``(tags to delete, rows to insert)`` taking this image's join rows from
+    ``old_tags`` to ``new_tags``. Touching only the difference keeps a one-tag
+    edit at one row (and one count-trigger firing) instead of a full rebuild."""
+    old_set, new_set = set(old_tags), set(new_tags)
+    gone = [tag for tag in old_set if tag not in new_set]
+    return gone, _tag_rows(image_id, [tag for tag in new_tags if tag not in old_set])
+
+
 # --- Repository (I/O) ---------------------------------------------------------
 
 
+# `app_settings` row holding a counter bumped by every join-table rewrite. It
+# lives in the DB, not process memory, so all uvicorn workers (and the scanner
+# threads) agree on when the cached tag listings went stale.
+TAGS_VERSION_ID = "tags_version"
+
+
+def _bump_version_stmt():
+    stmt = sqlite_insert(t.app_settings).values(_id=TAGS_VERSION_ID, doc=1)
+    # A bare JSON number, so `doc` still round-trips through the JSON type.
+    bumped = sa.func.coalesce(sa.cast(t.app_settings.c.doc, sa.Integer), 0) + 1
+    return stmt.on_conflict_do_update(
+        index_elements=[t.app_settings.c._id], set_={"doc": bumped}
+    )
+
+
+async def bump_tags_version(conn: AsyncConnection) -> None:
+    """Mark cached tag listings stale for every worker (caller's transaction)."""
+    await conn.execute(_bump_version_stmt())
+
+
+def bump_tags_version_sync(conn: Connection) -> None:
+    conn.execute(_bump_version_stmt())
+
+
+async def tags_version() -> int:
+    """The current tag-data version: one primary-key read."""
+    async with async_conn() as conn:
+        doc = (
+            await conn.execute(
+                sa.select(t.app_settings.c.doc).where(
+                    t.app_settings.c._id == TAGS_VERSION_ID
+                )
+            )
+        ).scalar()
+    return int(doc or 0)
+
+
+# Random id written once per database file. The version counter restarts at 0
+# when the file is recreated, so anything handed to clients (the /tags ETag)
+# pairs the two; an old database's "version N" then never matches the new one's.
+DB_NONCE_ID = "db_nonce"
+
+
+async def tags_version_and_nonce() -> tuple[int, str]:
+    """``(tags_version, db_nonce)`` from one read; the nonce is created on the
+    database's first call."""
+    ids = (TAGS_VERSION_ID, DB_NONCE_ID)
+    stmt = sa.select(t.app_settings.c._id, t.app_settings.c.doc).where(
+        t.app_settings.c._id.in_(ids)
+    )
+    async with async_conn() as conn:
+        docs = dict((await conn.execute(stmt)).all())
+    if DB_NONCE_ID not in docs:
+        async with async_tx() as conn:
+            await conn.execute(
+                sqlite_insert(t.app_settings)
+                .values(_id=DB_NONCE_ID, doc=uuid.uuid4().hex)
+                .on_conflict_do_nothing(index_elements=[t.app_settings.c._id])
+            )
+            docs = dict((await conn.execute(stmt)).all())
+    return int(docs.get(TAGS_VERSION_ID) or 0), docs[DB_NONCE_ID]
+
+
 async def resolve_image_id(conn: AsyncConnection, image_id: str) -> str | None:
     """Return the stored ``_id`` matching ``image_id`` (slash/backslash tolerant).
 
     The one async resolver: any caller holding a connection that needs the
     canonical ``_id`` for a possibly-variant spelling delegates here.
     """
-    for candidate in id_candidates(image_id):
-        found = (
-            await conn.execute(
-                sa.select(t.images.c._id).where(t.images.c._id == candidate)
-            )
-        ).scalar()
-        if found is not None:
-            return found
-    return None
+    rows = (
+        await conn.execute(
+            sa.select(t.images.c._id).where(t.ID_SLASH == slash_id(image_id))
+        )
+    ).fetchall()
+    row = first_candidate(rows, id_candidates(image_id))
+    return row._id if row is not None else None
+
+
+def _find_image_stmt(image_id: str, projection: dict | None) -> sa.Select:
+    cols = (
+        [t.images.c._id, *(t.images.c[k] for k, v in projection.items() if v)]
+        if projection
+        else [t.images]
+    )
+    return sa.select(*cols).where(t.ID_SLASH == slash_id(image_id))
 
 
 async def find_image(image_id: str, projection: dict | None = None) -> dict | None:
     """Look up an image by id, tolerating slash/backslash id variants.
 
-    ``projection`` is accepted for call-site compatibility but ignored — a single
-    row fetch is cheap, and callers only read a handful of fields.
+    ``projection`` (Mongo-style ``{"field": 1}``) narrows the fetch to ``_id``
+    plus those columns; the media routes' ``path``/``thumb_key`` lookups are
+    then covered by ``ix_images_id_slash`` and never touch the table row.
+    """
+    async with async_conn() as conn:
+        rows = (await conn.execute(_find_image_stmt(image_id, projection))).fetchall()
+    row = first_candidate(rows, id_candidates(image_id))
+    return row_to_doc(row) if row is not None else None
+
+
+def find_image_sync(image_id: str, projection: dict | None = None) -> dict | None:
+    """:func:`find_image` on the sync engine, for code already on a worker
+    thread (the media routes look up and stat in one hop)."""
+    with sync_conn() as conn:
+        rows = conn.execute(_find_image_stmt(image_id, projection)).fetchall()
+    row = first_candidate(rows, id_candidates(image_id))
+    return row_to_doc(row) if row is not None else None
+
+
+# Per-tag score lists in the ``ai`` doc: the bulk of a tagged row, and read by
+# no detail view. Opt-in via ``find_image_detail(include={"ai"})``.
+_AI_HEAVY_PATHS = ("$.general_tags", "$.character_tags")
+DETAIL_INCLUDES = frozenset({"ai"})
+
+
+async def find_image_detail(
+    image_id: str, *, include: Iterable[str] = ()
+) -> dict | None:
+    """The public image document for the detail view (slash/backslash tolerant).
+
+    The ``ai`` doc arrives without its per-tag score lists unless ``"ai"`` is in
+    ``include``. SQLite strips them (``json_remove``) before the row leaves the
+    engine, so they are neither decoded nor serialised.
+    """
+    ai = t.images.c.ai
+    if "ai" not in include:
+        ai = sa.func.json_remove(ai, *_AI_HEAVY_PATHS, type_=sa.JSON).label("ai")
+    helpers = {"ai", "gen_model", "gen_workflow_sig", "gen_group_id", "gen_prompt"}
+    cols = [c for c in t.images.c if c.name not in helpers]
+    async with async_conn() as conn:
+        rows = (
+            await conn.execute(
+                sa.select(*cols, ai).where(t.ID_SLASH == slash_id(image_id))
+            )
+        ).fetchall()
+    row = first_candidate(rows, id_candidates(image_id))
+    return row_to_doc(row) if row is not None else None
+
+
+async def find_gen_raw(image_id: str) -> dict | None:
+    """The stored embedded-generation ``raw`` for an image (slash/backslash
+    tolerant), or None.
+
+    ``image_gen_raw`` shares the image's ``_id``, so the spelling is resolved on
+    ``ix_images_id_slash`` and joined through — one statement, one index probe.
     """
     async with async_conn() as conn:
-        for candidate in id_candidates(image_id):
-            row = (
-                await conn.execute(
-                    sa.select(t.images).where(t.images.c._id == candidate)
+        rows = (
+            await conn.execute(
+                sa.select(t.images.c._id, t.image_gen_raw.c.raw)
+                .select_from(
+                    t.images.join(
+                        t.image_gen_raw, t.image_gen_raw.c._id == t.images.c._id
+                    )
                 )
-            ).first()
-            if row is not None:
-                return row_to_doc(row)
-    return None
+                .where(t.ID_SLASH == slash_id(image_id))
+            )
+        ).fetchall()
+    row = first_candidate(rows, id_candidates(image_id))
+    return row.raw if row is not None else None
 
 
 async def _persist(
     conn: AsyncConnection,
     image_id: str,
+    old_tags: list[str],
     new_tags: list[str],
     extra: dict[str, Any] | None = None,
-) -> None:
-    """Write the tag array + recomputed flags + rebuilt join rows for one image."""
+) -> bool:
+    """Write the tag array + recomputed flags for one image and move its join
+    rows from ``old_tags`` (the array as read in this transaction) to
+    ``new_tags``. Returns whether any join row moved; the caller then bumps the
+    tag version, once per transaction however many images it persisted."""
     values: dict[str, Any] = {"tags": new_tags, **recompute_flags(new_tags)}
     if extra:
         values.update(extra)
     await conn.execute(
         sa.update(t.images).where(t.images.c._id == image_id).values(**values)
     )
-    await conn.execute(
-        sa.delete(t.image_tags).where(t.image_tags.c.image_id == image_id)
-    )
-    rows = _tag_rows(image_id, new_tags)
+    gone, rows = _join_delta(image_id, old_tags, new_tags)
+    if gone:
+        await conn.execute(
+            sa.delete(t.image_tags).where(
+                t.image_tags.c.image_id == image_id, t.image_tags.c.tag.in_(gone)
+            )
+        )
     if rows:
         await conn.execute(sa.insert(t.image_tags), rows)
+    return bool(gone or rows)
 
 
 async def _mutate_tags(
@@ -326,23 +522,33 @@ async def _mutate_tags(
 ) -> None:
     """Resolve, read the current tag array, apply ``transform``, and persist —
     the one read-modify-write path behind every high-level tag intent. No-op if
-    the image is unknown."""
+    the image is unknown, or if nothing would change (e.g. removing a tag the
+    image doesn't carry): then no write happens at all."""
     async with async_tx() as conn:
-        resolved = await resolve_image_id(conn, image_id)
-        if resolved is None:
-            return
-        current = (
+        # Resolve + read in one statement rather than a lookup then a fetch.
+        rows = (
             await conn.execute(
-                sa.select(t.images.c.tags).where(t.images.c._id == resolved)
+                sa.select(t.images.c._id, t.images.c.tags).where(
+                    t.ID_SLASH == slash_id(image_id)
+                )
             )
-        ).scalar() or []
-        await _persist(conn, resolved, transform(current), extra=extra)
+        ).fetchall()
+        row = first_candidate(rows, id_candidates(image_id))
+        if row is None:
+            return
+        current = row.tags or []
+        new_tags = transform(current)
+        if new_tags == current and not extra:
+            return
+        if await _persist(conn, row._id, current, new_tags, extra=extra):
+            await bump_tags_version(conn)
 
 
-async def apply_manual(image_id: str, tags: list[str]) -> None:
-    await _mutate_tags(
-        image_id, lambda current: union_tags(current, [to_manual(x) for x in tags])
-    )
+async def apply_manual(image_id: str, tags: list[str]) -> list[str]:
+    """Add ``tags`` as manual tags; returns the prefixed tags that were applied."""
+    added = to_manual_all(tags)
+    await _mutate_tags(image_id, lambda current: union_tags(current, added))
+    return added
 
 
 async def remove_tags(image_id: str, tags: list[str]) -> None:
@@ -359,6 +565,44 @@ async def replace_ai(
     )
 
 
+# One AI tagging result: ``(image_id, ai_tags, ai_meta, rating)``.
+AIResult = tuple[str, list[str], dict[str, Any], str]
+
+
+async def replace_ai_many(results: list[AIResult]) -> int:
+    """:func:`replace_ai` for a batch of images in one transaction: one
+    resolve-and-read for the whole batch, one commit, one version bump. The AI
+    job runner flushes through here. Unknown ids are skipped; returns how many
+    images were written."""
+    if not results:
+        return 0
+    async with async_tx() as conn:
+        rows = (
+            await conn.execute(
+                sa.select(t.images.c._id, t.images.c.tags).where(
+                    t.ID_SLASH.in_({slash_id(r[0]) for r in results})
+                )
+            )
+        ).fetchall()
+        # Stored id -> its tag array as of this transaction (kept current, so a
+        # forced re-tag landing twice in one batch diffs against its first write).
+        tags_by_id = {row._id: row.tags or [] for row in rows}
+        written = 0
+        moved = False
+        for image_id, ai_tags, ai_meta, rating in results:
+            rid = next((c for c in id_candidates(image_id) if c in tags_by_id), None)
+            if rid is None:
+                continue
+            current = tags_by_id[rid]
+            new_tags = tags_by_id[rid] = with_replaced_ai(current, ai_tags)
+            extra = {"ai": ai_meta, "rating": rating}
+            moved |= await _persist(conn, rid, current, new_tags, extra=extra)
+            written += 1
+        if moved:
+            await bump_tags_version(conn)
+    return written
+
+
 # --- Scalar column writes (rating / score / quarantine) -----------------------
 #
 # These are the only writers of the per-image scalar columns, so the documented
@@ -392,21 +636,47 @@ async def set_quarantine(image_id: str, quarantined: bool) -> str | None:
     return await _set_columns(image_id, quarantined=quarantined)
 
 
+def _carries_ai():
+    """Rows the AI tagger has touched: AI tags present, or an ``ai`` subdoc set.
+
+    A cleared ``ai`` is stored as JSON ``null`` (not SQL NULL), so test the JSON
+    type rather than ``IS NOT NULL``.
+    """
+    return sa.or_(
+        t.images.c.has_ai_tags.is_(True),
+        sa.func.coalesce(sa.func.json_type(t.images.c.ai), "null") != "null",
+    )
+
+
 async def clear_ai_all() -> tuple[int, int]:
-    """Clear AI tags across every image. Returns ``(matched, modified)``."""
+    """Clear AI tags across every image. Returns ``(matched, modified)``.
+
+    Only rows carrying AI tags or AI metadata are read; of those, only rows whose
+    tag array actually changes get their array + join rows rebuilt. The rest need
+    just the ``ai``/``rating`` reset, done in one bulk UPDATE.
+    """
     async with async_tx() as conn:
         rows = (
-            await conn.execute(sa.select(t.images.c._id, t.images.c.tags))
+            await conn.execute(
+                sa.select(t.images.c._id, t.images.c.tags).where(_carries_ai())
+            )
         ).fetchall()
-        matched = len(rows)
+        if not rows:
+            return 0, 0
+        # Reset first: _persist below flips has_ai_tags, which _carries_ai keys on.
+        await conn.execute(
+            sa.update(t.images).where(_carries_ai()).values(ai=None, rating="-")
+        )
         modified = 0
         for row in rows:
             current = row.tags or []
             new = with_cleared_ai(current)
             if new != current:
                 modified += 1
-            await _persist(conn, row._id, new, extra={"ai": None, "rating": "-"})
-        return matched, modified
+                await _persist(conn, row._id, current, new)
+        if modified:
+            await bump_tags_version(conn)
+        return len(rows), modified
 
 
 # --- Sync repo helpers (scanner / reproject threads) --------------------------
@@ -416,18 +686,29 @@ def replace_prompt_sync(
     conn: Connection, image_id: str, prompt_tags: list[str]
 ) -> None:
     """Replace ``prompt:`` tags on one image, operating on a caller-owned sync
-    transaction so reprojection can batch many images per commit."""
+    transaction so reprojection can batch many images per commit.
+
+    Prompt tags arrive sorted and de-duplicated (``tokenize_prompt``), the same
+    form they were stored in, so an unchanged prompt is one list compare and no
+    write — the common case when reprojecting after a rule edit elsewhere."""
     current = (
         conn.execute(sa.select(t.images.c.tags).where(t.images.c._id == image_id))
     ).scalar()
     if current is None:
         return
+    if [tag for tag in current if is_prompt(tag)] == prompt_tags:
+        return
     new_tags = with_replaced_prompt(current, prompt_tags)
     values: dict[str, Any] = {"tags": new_tags, **recompute_flags(new_tags)}
-    conn.execute(
-        sa.update(t.images).where(t.images.c._id == image_id).values(**values)
-    )
-    conn.execute(sa.delete(t.image_tags).where(t.image_tags.c.image_id == image_id))
-    rows = _tag_rows(image_id, new_tags)
+    conn.execute(sa.update(t.images).where(t.images.c._id == image_id).values(**values))
+    gone, rows = _join_delta(image_id, current, new_tags)
+    if gone:
+        conn.execute(
+            sa.delete(t.image_tags).where(
+                t.image_tags.c.image_id == image_id, t.image_tags.c.tag.in_(gone)
+            )
+        )
     if rows:
         conn.execute(sa.insert(t.image_tags), rows)
+    if gone or rows:
+        bump_tags_version_sync(conn)
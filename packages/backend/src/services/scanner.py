@@ -18,6 +18,7 @@ import hashlib
 import mimetypes
 from dataclasses import dataclass
 from datetime import datetime
+from functools import lru_cache
 from multiprocessing import cpu_count
 import threading
 from threading import Lock
@@ -119,18 +120,24 @@ def _make_thumb_bytes(
 
 
 def is_image(path: Path) -> bool:
-    if path.suffix.lower() in IMAGE_EXTS:
+    return _is_image_suffix(path.suffix.lower())
+
+
+@lru_cache(maxsize=256)
+def _is_image_suffix(suffix: str) -> bool:
+    """:func:`is_image` by lowercased suffix. Cached: a library repeats a few
+    extensions across many files, so ``mimetypes`` runs once per extension."""
+    if suffix in IMAGE_EXTS:
         return True
-    mt, _ = mimetypes.guess_type(str(path))
+    mt, _ = mimetypes.guess_type(f"x{suffix}")
     return mt is not None and mt.startswith("image/")
 
 
 def file_hash(path: Path) -> str:
-    h = hashlib.sha1()
+    """SHA-1 hex digest of the file. ``file_digest`` runs the read loop in C
+    with its own large buffer instead of 8 KiB Python-level reads."""
     with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            h.update(chunk)
-    return h.hexdigest()
+        return hashlib.file_digest(f, "sha1").hexdigest()
 
 
 def _retry(
@@ -374,16 +381,17 @@ def scan_library_async(library_id: str, root: str) -> dict:
             files: list[Path] = []
             for dirpath, _, filenames in os.walk(root_path):
                 for fname in filenames:
+                    # Suffix check on the bare name first: no Path is built
+                    # for the sidecars and other non-images in the tree.
+                    if not _is_image_suffix(os.path.splitext(fname)[1].lower()):
+                        continue
                     p = Path(dirpath) / fname
-                    if is_image(p):
-                        files.append(p)
-                        try:
-                            discovered_image_ids.add(
-                                image_id_for(library_id, root_path, p)
-                            )
-                        except Exception:
-                            # Best-effort; path math can fail on unusual inputs
-                            pass
+                    files.append(p)
+                    try:
+                        discovered_image_ids.add(image_id_for(library_id, root_path, p))
+                    except Exception:
+                        # Best-effort; path math can fail on unusual inputs
+                        pass
             total = len(files)
             _lib_set(library_id, {"scan_total": total, "scan_done": 0})
 
@@ -408,17 +416,13 @@ def scan_library_async(library_id: str, root: str) -> dict:
             def _commit_batch(imgs: list[dict], raws: list[dict]) -> None:
                 # One short write transaction per batch keeps the SQLite write lock
                 # held briefly so concurrent API writes aren't starved. Image rows
-                # and their raw-gen rows commit together.
+                # and their raw-gen rows commit together, each as one executemany.
                 def _do_flush():
                     with sync_tx() as conn:
                         if raws:
-                            stmt = _gen_raw_upsert_stmt()
-                            for row in raws:
-                                conn.execute(stmt, row)
+                            conn.execute(_gen_raw_upsert_stmt(), raws)
                         if imgs:
-                            stmt = _image_upsert_stmt()
-                            for row in imgs:
-                                conn.execute(stmt, row)
+                            conn.execute(_image_upsert_stmt(), imgs)
 
                 _retry(_do_flush, attempts=3, base_delay_s=0.2)
 
@@ -503,6 +507,8 @@ def scan_library_async(library_id: str, root: str) -> dict:
                             t.image_gen_raw.c._id.in_(stale_image_ids)
                         )
                     )
+                    # The cascade dropped join rows: tag listings are stale.
+                    image_tags.bump_tags_version_sync(conn)
 
                 # Clean up corresponding thumbnail files on disk
                 if stale_thumb_keys:
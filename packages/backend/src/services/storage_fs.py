@@ -2,6 +2,8 @@ from __future__ import annotations
 
 import os
 import shutil
+import stat
+from functools import lru_cache
 from pathlib import Path
 
 from ..core.config import settings
@@ -11,6 +13,12 @@ def _root() -> Path:
     return settings.thumb_root_path
 
 
+@lru_cache(maxsize=8)
+def _resolved(root: Path) -> Path:
+    """``root.resolve()`` once per distinct root, not once per media request."""
+    return root.resolve()
+
+
 def ensure_thumb_root() -> None:
     """Create the thumbnail root dir. Run at startup (lifespan)."""
     _root().mkdir(parents=True, exist_ok=True)
@@ -26,7 +34,7 @@ def _safe_path(key: str) -> Path:
         # Empty/`/`-only key would resolve to the root itself — refuse, so a
         # future caller can't trigger `rmtree(root)` and wipe the whole store.
         raise ValueError(f"empty thumb key: {key!r}")
-    root = _root().resolve()
+    root = _resolved(_root())
     p = (root / key).resolve()
     if root not in p.parents:
         raise ValueError(f"thumb key escapes root: {key!r}")
@@ -58,6 +66,26 @@ def thumb_path(key: str) -> Path | None:
     return p if p.is_file() else None
 
 
+def stat_file(path: str | Path) -> os.stat_result | None:
+    """One ``stat`` of a regular file, or None if missing / not a regular file.
+
+    Media routes hand the result to ``FileResponse(stat_result=...)`` so the
+    existence check and the response headers share a single syscall.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st if stat.S_ISREG(st.st_mode) else None
+
+
+def thumb_stat(key: str) -> tuple[Path, os.stat_result] | None:
+    """``(path, stat)`` for a thumb key, or None if it doesn't exist."""
+    p = _safe_path(key)
+    st = stat_file(p)
+    return (p, st) if st is not None else None
+
+
 def delete_thumb(key: str) -> None:
     """Delete a single thumbnail file (best-effort)."""
     _safe_path(key).unlink(missing_ok=True)
@@ -19,6 +19,8 @@ from src.core.config import settings
 from src.database import db
 from src.database import schema as t
 from src.services import image_tags
+from src.api.tags import invalidate_tag_caches
+from src.services.ai_settings import invalidate_settings_cache
 
 
 @pytest_asyncio.fixture
@@ -28,6 +30,8 @@ async def temp_db(tmp_path: Path):
     settings.thumb_root = str(tmp_path / "thumbs")
     await db.reset_engines()
     await db.ensure_schema()
+    invalidate_settings_cache()
+    invalidate_tag_caches()
     yield
     await db.reset_engines()
 
@@ -73,6 +77,8 @@ def seed():
         score: float = 0,
         rating: str | None = None,
         thumb_key: str | None = None,
+        path: str | None = None,
+        mtime: float | None = None,
     ) -> None:
         tag_list = list(tags)
         flags = image_tags.recompute_flags(tag_list)
@@ -88,6 +94,8 @@ def seed():
                     score=score,
                     rating=rating,
                     thumb_key=thumb_key,
+                    path=path,
+                    mtime=mtime,
                     **flags,
                     **_gen_cols(gen),
                 )
@@ -101,5 +109,6 @@ def seed():
                     sa.insert(t.image_gen_terms),
                     [{"image_id": image_id, "term": term} for term in terms],
                 )
+            image_tags.bump_tags_version_sync(conn)
 
     return _seed
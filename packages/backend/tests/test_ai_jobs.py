@@ -0,0 +1,179 @@
+"""Unit tests for AI job queueing: de-dupe, in-flight skipping, and coalescing of
+small submissions into the newest queued job; plus the worker's batched result
+writes. No model or DB is touched: the worker test stubs prediction and the
+write."""
+
+import asyncio
+
+import pytest
+
+from src.services.ai_jobs import DEFAULT_AI_SETTINGS, AIJob, AIJobManager, _JobQueue
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_enqueue_dedupes_and_skips_in_flight():
+    jm = AIJobManager()
+    first = await jm.enqueue(ids=["a", "a", "b"])
+    assert first.total == 2
+    second = await jm.enqueue(ids=["b", "c"])
+    assert (second.total, second.skipped) == (1, 1)
+    assert jm.queue_depth() == 2
+
+
+async def test_coalesce_merges_into_queued_tail():
+    jm = AIJobManager()
+    first = await jm.enqueue(ids=["a"], coalesce=True)
+    second = await jm.enqueue(ids=["b", "a"], coalesce=True)
+    assert second is first
+    assert getattr(first, "_ids") == ["a", "b"]
+    assert (first.total, first.skipped) == (2, 1)
+    assert jm.queue_depth() == 1
+
+
+async def test_coalesce_never_merges_forced_or_cancelled_jobs():
+    jm = AIJobManager()
+    forced = await jm.enqueue(ids=["a"], force=True)
+    merged = await jm.enqueue(ids=["b"], coalesce=True)
+    assert merged is not forced
+
+    await jm.cancel(merged.id)
+    fresh = await jm.enqueue(ids=["c"], coalesce=True)
+    assert fresh is not merged
+    assert fresh.total == 1
+
+
+async def test_job_history_evicts_oldest_finished_jobs(monkeypatch):
+    from src.services import ai_jobs
+
+    monkeypatch.setattr(ai_jobs, "_MAX_JOBS", 2)
+    jm = AIJobManager()
+    live = await jm.enqueue(ids=["a"])  # queued: never evicted
+    done = [await jm.enqueue(ids=[]) for _ in range(3)]  # nothing to do: "done"
+    assert jm.get_job(live.id) is live
+    assert [j.id for j in jm.list_jobs()] == [done[2].id, live.id]
+
+
+async def test_job_queue_wakes_the_waiting_consumer_and_skips_cancelled():
+    q = _JobQueue()
+    a, b = AIJob(id="a", created_at=0), AIJob(id="b", created_at=0)
+    getter = asyncio.create_task(q.get())
+    await asyncio.sleep(0)
+    assert not getter.done()  # parked on an empty queue
+    q.put(a)
+    assert await getter is a
+    q.put(a)
+    q.put(b)
+    a.status = "cancelled"
+    q.drop()
+    assert q.qsize() == 1
+    assert (await q.get(), q.qsize()) == (b, 0)
+
+
+async def test_cancelling_a_queued_job_frees_its_ids_and_depth():
+    jm = AIJobManager()
+    job = await jm.enqueue(ids=["a", "b"])
+    assert await jm.cancel(job.id) is True
+    assert await jm.cancel(job.id) is False  # already cancelled
+    assert (job.status, jm.queue_depth()) == ("cancelled", 0)
+    assert (await jm.enqueue(ids=["a"])).total == 1  # no longer in flight
+
+
+async def test_stop_cancels_the_worker_and_idle_loop():
+    jm = AIJobManager()
+    jm.start()
+    worker, idle = jm._worker_task, jm._idle_task
+    await jm.stop()
+    assert worker.cancelled() and idle.cancelled()
+    assert (jm._worker_task, jm._idle_task) == (None, None)
+
+
+async def test_snapshot_lists_newest_jobs_first():
+    jm = AIJobManager()
+    jobs = [await jm.enqueue(ids=[f"i{n}"]) for n in range(4)]
+    snap = jm.snapshot(limit=3)
+    assert [j["id"] for j in snap["recent"]] == [j.id for j in jobs[:0:-1]]
+    assert snap["queue_depth"] == 4
+
+
+async def test_worker_writes_results_in_batches(monkeypatch):
+    from src.services import ai_jobs
+
+    writes: list[list[str]] = []
+
+    batches: list[list[str]] = []
+    events: list[str] = []
+
+    async def load_batch(self, ids):
+        events.append(f"load {ids[0]}")
+        return {}
+
+    async def tag_batch(self, *, ids, params, loaded):
+        events.append(f"tag {ids[0]}")
+        batches.append(ids)
+        return [
+            RuntimeError("unreadable") if i == "bad" else (i, ["cat"], {}, "general")
+            for i in ids
+        ]
+
+    async def replace_ai_many(results):
+        writes.append([r[0] for r in results])
+        return len(results)
+
+    async def settings():
+        return {}
+
+    monkeypatch.setattr(ai_jobs.AIJobManager, "_load_batch", load_batch)
+    monkeypatch.setattr(ai_jobs.AIJobManager, "_tag_batch", tag_batch)
+    monkeypatch.setattr(ai_jobs.image_tags, "replace_ai_many", replace_ai_many)
+    monkeypatch.setattr(ai_jobs, "get_ai_settings", settings)
+    loads = []
+    monkeypatch.setattr(
+        ai_jobs.get_tagger_manager(), "start_load", lambda **kw: loads.append(kw)
+    )
+    monkeypatch.setattr(ai_jobs, "_WRITE_BATCH", 2)
+    monkeypatch.setattr(ai_jobs, "_PREDICT_BATCH", 3)
+
+    jm = AIJobManager()
+    job = await jm.enqueue(ids=["a", "bad", "b", "c"])
+    worker = asyncio.create_task(jm._worker_loop())
+    try:
+        while job.status in ("queued", "running"):
+            await asyncio.sleep(0)
+    finally:
+        worker.cancel()
+    assert batches == [["a", "bad", "b"], ["c"]]
+    # The next batch is already loading while this one is tagged.
+    assert events == ["load a", "load c", "tag a", "tag c"]
+    assert writes == [["a", "b"], ["c"]]
+    assert (job.status, job.done, job.failed) == ("error", 3, 1)
+    assert [kw["model_repo"] for kw in loads] == [DEFAULT_AI_SETTINGS["model_repo"]]
+
+
+async def test_job_error_entries_are_capped_but_failures_all_count(monkeypatch):
+    from src.services import ai_jobs
+
+    monkeypatch.setattr(ai_jobs, "_MAX_JOB_ERRORS", 2)
+    job = AIJob(id="j", created_at=0)
+    for n in range(5):
+        job.fail(f"i{n}", RuntimeError("unreadable"))
+    assert job.failed == 5
+    assert job.errors == [
+        {"image_id": "i0", "error": "unreadable"},
+        {"image_id": "i1", "error": "unreadable"},
+    ]
+
+
+async def test_ai_result_takes_the_top_rating_and_dedupes_tags():
+    from src.services.ai_jobs import _ai_result, _predict_params
+
+    pred = {
+        "rating": {"general": 0.2, "sensitive": 0.7, "explicit": 0.1},
+        "general_tags": [("cat", 0.9), ("ear", 0.5)],
+        "character_tags": [("cat", 0.95)],
+    }
+    params = _predict_params({})
+    image_id, tags, meta, rating = _ai_result("L1:a", pred, params)
+    assert (image_id, tags, rating) == ("L1:a", ["cat", "ear"], "sensitive")
+    assert meta["model_repo"] == params["model_repo"]
+    assert _ai_result("L1:a", {}, params)[3] == "-"  # no rating scores
@@ -1,5 +1,6 @@
 """Integration test for the assembled AI status view — confirms the route stitches
-the tagger + download managers into one object with the settings' target."""
+the tagger + download managers into one object with the settings' target — and
+for the job runner's batch lookup against real rows."""
 
 import pytest
 
@@ -14,3 +15,102 @@ async def test_ai_status_assembles_model_view(client):
     # The download view is reported for the settings' target (repo + cache dir).
     assert body["model_download"]["model_repo"] == body["settings"]["model_repo"]
     assert body["model_download"]["cache_dir"] == body["settings"]["cache_dir"]
+
+
+async def test_settings_write_is_visible_to_the_next_status_poll(client):
+    await client.get("/ai/status")  # warm the settings cache
+    resp = await client.post("/ai/settings", json={"max_general": 7})
+    assert resp.json()["max_general"] == 7
+    resp = await client.get("/ai/status")
+    assert resp.json()["settings"]["max_general"] == 7
+
+
+async def test_tag_batch_reports_one_outcome_per_id_in_order(
+    temp_db, seed, monkeypatch, tmp_path
+):
+    from src.services import ai_jobs
+
+    (tmp_path / "a.png").write_bytes(b"A")
+    (tmp_path / "b.png").write_bytes(b"B")
+    seed("L1:sub\\a", path=str(tmp_path / "a.png"))
+    seed("L1:b", path=str(tmp_path / "b.png"))
+    seed("L1:gone", path=str(tmp_path / "gone.png"))
+    seed("L1:nopath")
+    calls = []
+
+    async def predict(images, **_kwargs):
+        calls.append(images)
+        pred = {"general_tags": [("cat", 0.9)], "rating": {"general": 0.8}}
+        return [pred] * len(images)
+
+    monkeypatch.setattr(ai_jobs.get_tagger_manager(), "predict_bytes_batch", predict)
+    ids = ["L1:ghost", "L1:sub/a", "L1:nopath", "L1:gone", "L1:b"]
+    out = await ai_jobs.AIJobManager()._tag_batch(
+        ids=ids, params=ai_jobs._predict_params({})
+    )
+    assert calls == [[b"A", b"B"]]  # one model call for the readable pair
+    assert [o[0] if isinstance(o, tuple) else type(o).__name__ for o in out] == [
+        "RuntimeError",
+        "L1:sub/a",
+        "RuntimeError",
+        "FileNotFoundError",
+        "L1:b",
+    ]
+    assert (out[1][1], out[1][3]) == (["cat"], "general")
+
+
+async def test_enqueue_untagged_picks_newest_untagged_per_library(temp_db, seed):
+    from src.services.ai_jobs import AIJobManager
+
+    seed("L1:a")
+    seed("L1:b", tags=("cat",))  # already AI-tagged
+    seed("L1:c", tags=("manual:fav",))
+    seed("L2:d", library_id="L2")
+    jm = AIJobManager()
+    job = await jm.enqueue_untagged(limit=2)
+    assert getattr(job, "_ids") == ["L2:d", "L1:c"]
+    # L1:c is already queued: the pick passes over it rather than spending
+    # the limit on it (which would leave nothing to enqueue).
+    job = await jm.enqueue_untagged(limit=1, library_id="L1")
+    assert getattr(job, "_ids") == ["L1:a"]
+    assert job.skipped == 0
+
+
+async def test_settings_updates_merge_into_the_stored_doc(client):
+    from src.services import ai_settings
+
+    await client.post("/ai/settings", json={"max_general": 7})  # inserts the row
+    await client.post("/ai/settings", json={"general_thresh": 0.5})
+    stored = await ai_settings._read_ai_doc()
+    assert stored == {"max_general": 7, "general_thresh": 0.5}
+    resp = await client.post("/ai/settings", json={"max_general": 9})
+    assert (resp.json()["max_general"], resp.json()["general_thresh"]) == (9, 0.5)
+
+
+async def test_tag_batch_predicts_each_distinct_file_once(
+    temp_db, seed, monkeypatch, tmp_path
+):
+    from src.services import ai_jobs
+
+    for name, data in (("a", b"same"), ("b", b"same"), ("c", b"other")):
+        (tmp_path / name).write_bytes(data)
+        seed(f"L1:{name}", path=str(tmp_path / name))
+    calls = []
+
+    async def predict(images, **_kwargs):
+        calls.append(images)
+        return [{"general_tags": [(img.decode(), 0.9)]} for img in images]
+
+    monkeypatch.setattr(ai_jobs.get_tagger_manager(), "predict_bytes_batch", predict)
+    jm = ai_jobs.AIJobManager()
+    params = ai_jobs._predict_params({})
+    out = await jm._tag_batch(ids=["L1:a", "L1:b", "L1:c"], params=params)
+    assert [o[1] for o in out] == [["same"], ["same"], ["other"]]
+    assert calls == [[b"same", b"other"]]
+    # A re-run with unchanged settings is served from the cache...
+    await jm._tag_batch(ids=["L1:b"], params=params)
+    assert len(calls) == 1
+    # ...but different thresholds are a different prediction.
+    other = ai_jobs._predict_params({"general_thresh": 0.5})
+    await jm._tag_batch(ids=["L1:b"], params=other)
+    assert calls[1:] == [[b"same"]]
@@ -3,14 +3,21 @@ Previously buried inside WDTagger.predict behind an ONNX session."""
 
 import asyncio
 import contextlib
+from io import BytesIO
 from pathlib import Path
 
 import numpy as np
+import pytest
+from PIL import Image
 
 from src.services.ai_tagger import (
     LabelIndex,
     TaggerManager,
+    _load_labels_from_csv,
+    _quantized_int8,
+    decode_and_prepare,
     mcut_threshold,
+    prepare_image,
     select_tags,
 )
 from src.services.ai_tagger_download import (
@@ -79,6 +86,166 @@ def test_select_tags_general_mcut_overrides_threshold():
     assert out["general_tags"] == [("cat", 0.9)]
 
 
+def test_labels_parsed_once_per_csv_version(tmp_path):
+    csv_path = tmp_path / "selected_tags.csv"
+    csv_path.write_text("tag_id,name,category\n0,general,9\n1,long_hair,0\n")
+    first = _load_labels_from_csv(str(csv_path))
+    assert first.names == ["general", "long hair"]
+    assert _load_labels_from_csv(str(csv_path)) is first
+    csv_path.write_text("tag_id,name,category\n0,general,9\n1,cat_ears,0\n")
+    assert _load_labels_from_csv(str(csv_path)).names == ["general", "cat ears"]
+
+
+def test_quantized_model_is_reused_while_newer_than_source(tmp_path):
+    import os
+
+    src, int8 = tmp_path / "m.onnx", tmp_path / "m.int8.onnx"
+    src.write_bytes(b"fp32")
+    int8.write_bytes(b"int8")
+    os.utime(src, (1000, 1000))
+    os.utime(int8, (2000, 2000))
+    assert _quantized_int8(str(src)) == str(int8)  # no rebuild needed
+
+
+def test_ai_quantize_rejects_unknown_modes(monkeypatch):
+    from pydantic import ValidationError
+
+    from src.core.config import Settings
+
+    monkeypatch.setenv("AI_QUANTIZE", "int8")
+    assert Settings().ai_quantize == "int8"
+    monkeypatch.setenv("AI_QUANTIZE", "fp16")  # a typo must not silently mean "off"
+    with pytest.raises(ValidationError):
+        Settings()
+
+
+def test_prepare_image_flattens_alpha_pads_and_swaps_to_bgr():
+    img = Image.new("RGBA", (2, 1), (255, 0, 0, 255))
+    img.putpixel((1, 0), (0, 0, 255, 0))  # fully transparent -> white
+    out = prepare_image(img, None)
+    assert out.shape == (1, 2, 2, 3) and out.dtype == np.float32
+    # The 2x1 image, then a row of white pad under it; channels are BGR.
+    assert out[0, 0].tolist() == [[0, 0, 255], [255, 255, 255]]
+    assert out[0, 1].tolist() == [[255, 255, 255], [255, 255, 255]]
+    half = prepare_image(Image.new("RGBA", (1, 1), (0, 0, 0, 128)), None)
+    assert half[0, 0, 0].tolist() == [127, 127, 127]
+    assert prepare_image(Image.new("RGB", (5, 3)), 4).shape == (1, 4, 4, 3)
+
+
+def test_decode_and_prepare_drafts_large_jpegs_to_model_size(monkeypatch):
+    from src.services import ai_tagger
+
+    buf = BytesIO()
+    Image.new("RGB", (1600, 800), (200, 40, 40)).save(buf, "JPEG")
+    sizes = []
+
+    def spy(img, target_size):
+        sizes.append(img.size)
+        return prepare_image(img, target_size)
+
+    monkeypatch.setattr(ai_tagger, "prepare_image", spy)
+    out = decode_and_prepare(buf.getvalue(), 100)
+    assert sizes == [(200, 100)]  # decoded at 1/8 scale, still >= 100 wide
+    assert out.shape == (1, 100, 100, 3)
+    assert np.abs(out[0, 50, 50] - [40, 40, 200]).max() <= 4  # BGR
+
+
+class _FakeSession:
+    """Stands in for an onnxruntime session: records each run's batch and
+    scores row ``n`` as [0, 0, 0.9, 0.2 * n, 0]."""
+
+    def __init__(self) -> None:
+        self.runs: list[tuple[int, ...]] = []
+
+    def get_inputs(self):
+        return [type("In", (), {"name": "x", "shape": [None, 4, 4, 3]})]
+
+    def get_outputs(self):
+        return [type("Out", (), {"name": "y"})]
+
+    def run(self, _outputs, feed):
+        batch = feed["x"]
+        self.runs.append(batch.shape)
+        return [np.array([[0, 0, 0.9, 0.2 * n, 0] for n in range(len(batch))])]
+
+
+async def test_predict_bytes_batch_runs_one_stacked_batch(monkeypatch):
+    def png(size) -> bytes:
+        buf = BytesIO()
+        Image.new("RGB", size).save(buf, "PNG")
+        return buf.getvalue()
+
+    async def loaded(**_kwargs):
+        return None
+
+    mgr = TaggerManager()
+    session = _FakeSession()
+    mgr._tagger._session, mgr._tagger._labels = session, _labels()
+    mgr._tagger._target_size = 4
+    monkeypatch.setattr(mgr, "ensure_loaded", loaded)
+    out = await mgr.predict_bytes_batch(
+        [png((8, 6)), b"not an image", png((3, 3)), png((5, 9))],
+        model_repo="r",
+        cache_dir="/c",
+        general_thresh=0.35,
+        character_thresh=0.85,
+    )
+    assert session.runs == [(3, 4, 4, 3)]  # decodable images, one run
+    assert isinstance(out[1], Exception)
+    general = [[t for t, _ in o["general_tags"]] for o in (out[0], out[2], out[3])]
+    assert general == [["cat"], ["cat"], ["cat", "dog"]]
+
+
+async def test_predict_runs_off_loop_and_survives_unload(monkeypatch):
+    import threading
+
+    buf = BytesIO()
+    Image.new("RGB", (4, 4)).save(buf, "PNG")
+    started, release = threading.Event(), threading.Event()
+
+    class _SlowSession(_FakeSession):
+        def run(self, outputs, feed):
+            started.set()
+            release.wait(5)
+            return super().run(outputs, feed)
+
+    async def loaded(**_kwargs):
+        return None
+
+    mgr = TaggerManager()
+    mgr._tagger._session, mgr._tagger._labels = _SlowSession(), _labels()
+    mgr._tagger._target_size = 4
+    monkeypatch.setattr(mgr, "ensure_loaded", loaded)
+    task = asyncio.create_task(
+        mgr.predict_bytes(
+            image_bytes=buf.getvalue(),
+            model_repo="r",
+            cache_dir="/c",
+            general_thresh=0.35,
+            character_thresh=0.85,
+            general_mcut=False,
+            character_mcut=False,
+            max_general=80,
+            max_character=40,
+        )
+    )
+    while not started.is_set():
+        await asyncio.sleep(0.01)  # the loop stays free while the model runs
+    await mgr.unload()  # not blocked by the run, and doesn't break it
+    release.set()
+    assert [t for t, _ in (await task)["general_tags"]] == ["cat"]
+
+
+async def test_predict_reports_a_model_gone_before_the_run(monkeypatch):
+    async def loaded(**_kwargs):
+        return None  # "loaded", but an unload landed before the batch started
+
+    mgr = TaggerManager()
+    monkeypatch.setattr(mgr, "ensure_loaded", loaded)
+    with pytest.raises(RuntimeError, match="tagger model is not loaded"):
+        await mgr.predict_bytes_batch([b"x"], model_repo="r", cache_dir="/c")
+
+
 # --- Download availability / load state machine ------------------------------
 
 
@@ -107,6 +274,56 @@ async def test_download_start_skips_when_model_present(tmp_path):
     assert (repo, cache) not in dm._tasks
 
 
+async def test_download_run_shares_one_client_across_files(tmp_path, monkeypatch):
+    import httpx
+
+    from src.services import ai_tagger_download
+
+    clients = []
+    real_client = httpx.AsyncClient
+
+    def fake_client(**kwargs):
+        transport = httpx.MockTransport(lambda req: httpx.Response(200, content=b"x"))
+        clients.append(real_client(transport=transport, **kwargs))
+        return clients[-1]
+
+    monkeypatch.setattr(ai_tagger_download.httpx, "AsyncClient", fake_client)
+    dm = ModelDownloadManager()
+    repo, cache = "Org/Model", str(tmp_path)
+    await dm.start(model_repo=repo, cache_dir=cache)
+    await dm.wait(model_repo=repo, cache_dir=cache)
+    assert dm.get_state(model_repo=repo, cache_dir=cache).status == "done"
+    assert dm.is_available(model_repo=repo, cache_dir=cache)
+    assert len(clients) == 1
+
+
+async def test_download_failure_reports_the_file_error(tmp_path, monkeypatch):
+    import httpx
+
+    from src.services import ai_tagger_download
+
+    real_client = httpx.AsyncClient
+
+    def respond(req):
+        if req.url.path.endswith(".csv"):
+            return httpx.Response(404)
+        return httpx.Response(200, content=b"x")
+
+    monkeypatch.setattr(
+        ai_tagger_download.httpx,
+        "AsyncClient",
+        lambda **kw: real_client(transport=httpx.MockTransport(respond), **kw),
+    )
+    dm = ModelDownloadManager()
+    repo, cache = "Org/Model", str(tmp_path)
+    await dm.start(model_repo=repo, cache_dir=cache)
+    await dm.wait(model_repo=repo, cache_dir=cache)
+    st = dm.get_state(model_repo=repo, cache_dir=cache)
+    assert st.status == "error"
+    assert "404" in st.error  # the file's error, not an exception group
+    assert not dm.is_available(model_repo=repo, cache_dir=cache)
+
+
 async def test_start_load_supersedes_stale_target_without_clobbering(monkeypatch):
     # Changing the cache dir mid-load supersedes the stale load; the cancelled
     # task must NOT overwrite the new load's status when its CancelledError
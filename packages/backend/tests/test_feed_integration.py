@@ -121,3 +121,58 @@ async def test_cursor_pagination_walks_every_row_once_in_order(client, seed):
             break
 
     assert seen == expected  # each row once, stable desc order across pages
+
+
+async def test_offset_paging_still_works_and_warns(client, seed):
+    seed("L1:a")
+    seed("L1:b")
+    resp = await client.get("/images", params={"offset": 1})
+    assert [it["_id"] for it in resp.json()] == ["L1:a"]
+    assert "deprecated" in resp.headers["X-Tagify-Warn"]
+    assert resp.json()[0]["thumb_url"] == "/api/images/L1%3Aa/thumb"
+
+
+async def test_deep_offset_rejected_and_full_pages_carry_next_cursor(client, seed):
+    for i in range(3):
+        seed(f"L1:{i}")
+    resp = await client.get("/images", params={"offset": 1001})
+    assert resp.status_code == 422
+    assert "cursor" in resp.json()["detail"]
+    deep = await client.get("/images/groups", params={"offset": 1001})
+    assert deep.status_code == 422
+    # A cursor makes offset moot, so it never trips the cap.
+    resp = await client.get("/images", params={"offset": 5000, "cursor": "L1:9"})
+    assert resp.status_code == 200
+
+    full = await client.get("/images", params={"limit": 2})
+    assert full.headers["X-Next-Cursor"] == "L1:1"
+    rest = await client.get("/images", params={"limit": 2, "cursor": "L1:1"})
+    assert [it["_id"] for it in rest.json()] == ["L1:0"]
+    assert "X-Next-Cursor" not in rest.headers
+    grouped = await client.get("/images/groups", params={"limit": 2})
+    assert grouped.headers["X-Next-Cursor"] == "L1:1"
+
+
+async def test_feed_and_groups_rows_share_one_shape(client, seed):
+    seed("L1:a", gen={"group_id": "G", "workflow_sig": "s"}, thumb_key="L1/a.webp")
+    feed = (await client.get("/images")).json()[0]
+    assert set(feed) == {
+        "_id",
+        "path",
+        "width",
+        "height",
+        "blurhash",
+        "score",
+        "thumb_url",
+    }
+    group = (await client.get("/images/groups")).json()[0]
+    assert set(group) == set(feed) | {"group_id", "group_count"}
+
+
+async def test_thumb_url_is_versioned_by_mtime(client, seed):
+    seed("L1:a", mtime=1700000000.75)
+    seed("L1:b")  # never stat'ed: plain URL
+    by_id = {it["_id"]: it for it in (await client.get("/images")).json()}
+    assert by_id["L1:a"]["thumb_url"] == "/api/images/L1%3Aa/thumb?v=1700000000"
+    assert by_id["L1:b"]["thumb_url"] == "/api/images/L1%3Ab/thumb"
+    assert "mtime" not in by_id["L1:a"]
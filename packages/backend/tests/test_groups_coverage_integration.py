@@ -35,6 +35,20 @@ async def test_groups_span_page_order_desc(client, seed):
     assert ids == ["L1:b", "L1:a"]  # rep _id desc
 
 
+async def test_groups_cursor_pages_by_representative_id(client, seed):
+    seed("L1:a", gen={"group_id": "GA", "workflow_sig": "s"})
+    seed("L1:b1", gen={"group_id": "GB", "workflow_sig": "s"})
+    seed("L1:b2", gen={"group_id": "GB", "workflow_sig": "s"})
+    seed("L1:c")
+    first = (await client.get("/images/groups", params={"limit": 2})).json()
+    assert [r["_id"] for r in first] == ["L1:c", "L1:b2"]
+    rest = (
+        await client.get("/images/groups", params={"limit": 2, "cursor": "L1:b2"})
+    ).json()
+    # The GB batch doesn't reappear via its older member; count is still full.
+    assert [r["_id"] for r in rest] == ["L1:a"]
+
+
 async def test_ai_coverage_per_library_counts(client, seed):
     seed("L1:a", tags=("1girl",), library_id="L1")  # ai-tagged
     seed("L1:b", tags=("manual:fav",), library_id="L1")  # not ai-tagged
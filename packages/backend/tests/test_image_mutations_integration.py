@@ -7,6 +7,7 @@ import sqlalchemy as sa
 
 from src.database import db
 from src.database import schema as t
+from src.services import image_tags
 
 pytestmark = pytest.mark.asyncio
 
@@ -61,3 +62,60 @@ async def test_mutation_resolves_slash_variant(client, seed):
     assert resp.status_code == 200, resp.text
     assert resp.json()["_id"] == "L1:sub\\img.png"
     assert (await _row("L1:sub\\img.png")).rating == "general"
+
+
+async def test_get_image_returns_public_doc(client, seed):
+    seed("L1:a", tags=("cat",), gen={"model": "m", "prompt": "p"})
+    resp = await client.get("/images/L1:a")
+    assert resp.status_code == 200, resp.text
+    doc = resp.json()
+    assert doc["_id"] == "L1:a"
+    assert doc["tags"] == ["cat"]
+    assert doc["gen"] == {"model": "m", "prompt": "p"}
+    # Promoted gen_* helper columns stay internal.
+    assert "gen_model" not in doc
+
+
+async def test_get_image_trims_ai_score_lists_unless_included(client, seed):
+    seed("L1:a")
+    meta = {
+        "model_repo": "org/m",
+        "rating": {"general": 0.9},
+        "general_tags": [["cat", 0.8]],
+        "character_tags": [],
+    }
+    await image_tags.replace_ai("L1:a", ai_tags=["cat"], ai_meta=meta, rating="general")
+    doc = (await client.get("/images/L1:a")).json()
+    assert doc["ai"] == {"model_repo": "org/m", "rating": {"general": 0.9}}
+    assert doc["tags"] == ["cat"]
+    full = (await client.get("/images/L1:a", params={"include": "ai"})).json()
+    assert full["ai"] == meta
+    bad = await client.get("/images/L1:a", params={"include": "embeddings"})
+    assert bad.status_code == 422
+    seed("L1:b")  # never tagged: ai stays null
+    assert (await client.get("/images/L1:b")).json()["ai"] is None
+
+
+async def test_get_image_prefers_exact_spelling_over_variant(client, seed):
+    seed("L1:sub\\img.png", rating="general")
+    resp = await client.get("/images/L1:sub/img.png")
+    assert resp.json()["_id"] == "L1:sub\\img.png"
+    # If both spellings are stored, the requested one wins.
+    seed("L1:sub/img.png", rating="sensitive")
+    assert (await client.get("/images/L1:sub/img.png")).json()["rating"] == "sensitive"
+    assert (await client.get("/images/L1:sub\\img.png")).json()["rating"] == "general"
+
+
+async def test_workflow_resolves_slash_variant_through_images(client, seed):
+    seed("L1:sub\\img.png")
+    async with db.async_tx() as conn:
+        await conn.execute(
+            sa.insert(t.image_gen_raw).values(
+                _id="L1:sub\\img.png",
+                library_id="L1",
+                raw={"source": "a1111", "parameters": "a cat"},
+            )
+        )
+    resp = await client.get("/images/L1:sub/img.png/workflow")
+    assert resp.json() == {"source": "a1111", "parameters": "a cat"}
+    assert (await client.get("/images/L1:none.png/workflow")).status_code == 404
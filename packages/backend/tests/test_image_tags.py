@@ -6,6 +6,8 @@ recompute — so the invariant has a test surface that needs no database. The
 transactional repo writes are covered separately by the DB integration tests.
 """
 
+from types import SimpleNamespace as Row
+
 from src.services import image_tags as it
 
 
@@ -25,6 +27,13 @@ def test_id_candidates_backslash_spelling():
     assert it.id_candidates("L1:a\\b") == ["L1:a\\b", "L1:a/b"]
 
 
+def test_first_candidate_prefers_primary_spelling():
+    rows = [Row(_id="L1:a\\b"), Row(_id="L1:a/b")]
+    assert it.first_candidate(rows, ["L1:a/b", "L1:a\\b"])._id == "L1:a/b"
+    assert it.first_candidate(rows[:1], ["L1:a/b", "L1:a\\b"])._id == "L1:a\\b"
+    assert it.first_candidate([], ["L1:a/b"]) is None
+
+
 # --- prefix helpers ----------------------------------------------------------
 
 
@@ -33,6 +42,13 @@ def test_to_manual_adds_prefix_idempotently():
     assert it.to_manual("manual:cat") == "manual:cat"
 
 
+def test_to_manual_all_prefixes_and_dedupes_in_order():
+    assert it.to_manual_all(["cat", "dog", "manual:cat", "dog"]) == [
+        "manual:cat",
+        "manual:dog",
+    ]
+
+
 def test_is_manual():
     assert it.is_manual("manual:cat")
     assert not it.is_manual("cat")
@@ -122,6 +138,26 @@ def test_excluded_prefixes_per_kind():
     assert it.excluded_prefixes(include_manual=True, include_prompt=True) == []
 
 
+def test_kept_tag_ranges_are_the_gaps_between_prefix_spans():
+    assert it.kept_tag_ranges(["prompt:", "manual:"]) == [
+        (None, "manual:"),
+        ("manual;", "prompt:"),
+        ("prompt;", None),
+    ]
+    assert it.kept_tag_ranges([]) == [(None, None)]
+
+    def kept(tag, ranges):
+        return any(
+            (lo is None or tag >= lo) and (hi is None or tag < hi) for lo, hi in ranges
+        )
+
+    ranges = it.kept_tag_ranges(["manual:", "prompt:"])
+    for tag in ("manual", "manual;x", "mz", "prompts", "zz", "1girl", ""):
+        assert kept(tag, ranges), tag
+    for tag in ("manual:", "manual:fav", "prompt:x", "prompt:\uffff"):
+        assert not kept(tag, ranges), tag
+
+
 # --- flag recompute ----------------------------------------------------------
 
 
@@ -227,3 +263,9 @@ def test_id_variants_swaps_separators():
 
 def test_id_variants_excludes_primary_when_no_separator():
     assert it.id_variants("lib:flat") == []
+
+
+def test_join_delta_touches_only_the_difference():
+    gone, rows = it._join_delta("img1", ["cat", "dog", "manual:fav"], ["dog", "x", "x"])
+    assert sorted(gone) == ["cat", "manual:fav"]
+    assert rows == [{"image_id": "img1", "tag": "x", "base": "x"}]
@@ -0,0 +1,115 @@
+"""Integration tests for the library routes: the listing (whole, or cursor-paged
+when limited, in the order libraries were added) and removal."""
+
+import pytest
+import sqlalchemy as sa
+
+from src.database import db
+from src.database import schema as t
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_list_libraries_pages_in_creation_order(client, temp_db):
+    ids = ["f3", "a1", "c2", "b9", "e5"]  # deliberately not sorted
+    async with db.async_tx() as conn:
+        await conn.execute(
+            sa.insert(t.libraries), [{"_id": i, "path": f"/p/{i}"} for i in ids]
+        )
+
+    assert [r["_id"] for r in (await client.get("/libraries")).json()] == ids
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        resp = await client.get("/libraries", params=params)
+        seen += [r["_id"] for r in resp.json()]
+        cursor = resp.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        assert cursor == seen[-1]
+    assert seen == ids
+
+
+async def test_list_libraries_is_unbounded_without_a_limit(client, temp_db):
+    ids = [f"L{i:03d}" for i in range(250)]
+    async with db.async_tx() as conn:
+        await conn.execute(
+            sa.insert(t.libraries), [{"_id": i, "path": f"/p/{i}"} for i in ids]
+        )
+    resp = await client.get("/libraries")
+    assert [r["_id"] for r in resp.json()] == ids
+    assert "X-Next-Cursor" not in resp.headers
+
+
+async def test_list_libraries_rejects_an_unknown_cursor(client, temp_db):
+    async with db.async_tx() as conn:
+        await conn.execute(sa.insert(t.libraries).values(_id="L1", path="/p"))
+    resp = await client.get("/libraries", params={"limit": 2, "cursor": "gone"})
+    assert resp.status_code == 422
+
+
+async def test_remove_library_drops_rows_and_thumbs(client, seed):
+    from src.core.config import settings
+
+    async with db.async_tx() as conn:
+        await conn.execute(sa.insert(t.libraries).values(_id="L1", path="/p"))
+    seed("L1:a", library_id="L1", tags=("cat",))
+    seed("L2:a", library_id="L2", tags=("cat",))
+    thumb = settings.thumb_root_path / "L1" / "a.webp"
+    thumb.parent.mkdir(parents=True)
+    thumb.write_bytes(b"x")
+
+    assert (await client.delete("/libraries/L1")).json() == {"removed": "L1"}
+    async with db.async_conn() as conn:
+        left = (await conn.execute(sa.select(t.images.c._id))).scalars().all()
+        libs = (await conn.execute(sa.select(t.libraries.c._id))).scalars().all()
+    assert left == ["L2:a"] and libs == []
+    assert not thumb.parent.exists()
+    counts = {r["_id"]: r["count"] for r in (await client.get("/tags")).json()}
+    assert counts == {"cat": 1}
+
+
+async def test_remove_library_keeps_thumbs_when_the_row_delete_fails(
+    client, seed, monkeypatch
+):
+    from src.api import libraries
+    from src.core.config import settings
+
+    async with db.async_tx() as conn:
+        await conn.execute(sa.insert(t.libraries).values(_id="L1", path="/p"))
+    seed("L1:a", library_id="L1")
+    thumb = settings.thumb_root_path / "L1" / "a.webp"
+    thumb.parent.mkdir(parents=True)
+    thumb.write_bytes(b"x")
+
+    async def fail(conn):
+        raise RuntimeError("disk I/O error")
+
+    monkeypatch.setattr(libraries.image_tags, "bump_tags_version", fail)
+    with pytest.raises(RuntimeError):
+        await client.delete("/libraries/L1")
+    async with db.async_conn() as conn:
+        left = (await conn.execute(sa.select(t.images.c._id))).scalars().all()
+    assert left == ["L1:a"]  # rolled back...
+    assert thumb.exists()  # ...and its thumbnails are still there
+
+
+async def test_progress_reports_scan_state(client, temp_db):
+    async with db.async_tx() as conn:
+        await conn.execute(
+            sa.insert(t.libraries).values(
+                _id="L1", path="/p", scanning=True, scan_total=10, scan_done=4
+            )
+        )
+    resp = await client.get("/libraries/L1/progress")
+    assert resp.json() == {
+        "scanning": True,
+        "scan_total": 10,
+        "scan_done": 4,
+        "indexed_count": 0,
+        "last_scanned": None,
+        "scan_error": None,
+        "scan_failed_count": 0,
+    }
+    assert (await client.get("/libraries/nope/progress")).status_code == 404
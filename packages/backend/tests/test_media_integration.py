@@ -0,0 +1,199 @@
+"""Integration tests for the FS-backed media routes (original file + thumbnail,
+GET and HEAD), served through the real ASGI app from temp files."""
+
+from datetime import timedelta
+from email.utils import format_datetime, parsedate_to_datetime
+
+import pytest
+
+from src.core.config import settings
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def original(tmp_path):
+    p = tmp_path / "orig.png"
+    p.write_bytes(b"0123456789")
+    return p
+
+
+@pytest.fixture
+def thumb():
+    key = "L1/a.webp"
+    p = settings.thumb_root_path / key
+    p.parent.mkdir(parents=True, exist_ok=True)
+    p.write_bytes(b"thumb-bytes")
+    return key
+
+
+async def test_file_full_and_range(client, seed, original):
+    seed("L1:a", path=str(original))
+    resp = await client.get("/images/L1:a/file")
+    assert resp.status_code == 200
+    assert resp.content == b"0123456789"
+    assert resp.headers["content-type"] == "image/png"
+    assert "etag" in resp.headers
+
+    resp = await client.get("/images/L1:a/file", headers={"Range": "bytes=2-4"})
+    assert resp.status_code == 206
+    assert resp.content == b"234"
+    assert resp.headers["content-range"] == "bytes 2-4/10"
+
+
+async def test_file_media_type_from_extension(client, seed, tmp_path):
+    cases = {
+        "a.JPG": "image/jpeg",
+        "b.webp": "image/webp",
+        "c.bmp": "image/bmp",
+        "d.txt": "text/plain",  # outside the table: mimetypes decides
+        "e.unknownext": "application/octet-stream",
+    }
+    for i, (name, media_type) in enumerate(cases.items()):
+        (tmp_path / name).write_bytes(b"x")
+        seed(f"L1:{i}", path=str(tmp_path / name))
+        resp = await client.get(f"/images/L1:{i}/file")
+        assert resp.headers["content-type"].split(";")[0] == media_type, name
+
+
+async def test_file_head_reports_size(client, seed, original):
+    seed("L1:a", path=str(original))
+    resp = await client.head("/images/L1:a/file")
+    assert resp.status_code == 200
+    assert resp.headers["content-length"] == "10"
+
+
+async def test_file_missing_on_disk_is_404(client, seed, tmp_path):
+    seed("L1:a", path=str(tmp_path / "gone.png"))
+    assert (await client.get("/images/L1:a/file")).status_code == 404
+    assert (await client.head("/images/L1:a/file")).status_code == 404
+    # A directory is not servable either.
+    seed("L1:b", path=str(tmp_path))
+    assert (await client.get("/images/L1:b/file")).status_code == 404
+
+
+async def test_thumb_served_from_thumb_root(client, seed, thumb):
+    seed("L1:a", thumb_key=thumb)
+    resp = await client.get("/images/L1:a/thumb")
+    assert resp.status_code == 200
+    assert resp.content == b"thumb-bytes"
+    assert resp.headers["content-type"] == "image/webp"
+
+
+async def test_thumb_missing_is_404(client, seed):
+    seed("L1:a", thumb_key="L1/none.webp")
+    assert (await client.get("/images/L1:a/thumb")).status_code == 404
+    seed("L1:b")
+    assert (await client.get("/images/L1:b/thumb")).status_code == 404
+
+
+async def test_conditional_get_returns_304(client, seed, original, thumb):
+    seed("L1:a", path=str(original), thumb_key=thumb)
+    for url in ("/images/L1:a/file", "/images/L1:a/thumb"):
+        first = await client.get(url)
+        etag, last_mod = first.headers["etag"], first.headers["last-modified"]
+
+        resp = await client.get(url, headers={"If-None-Match": f'"x", {etag}'})
+        assert resp.status_code == 304
+        assert resp.content == b""
+        assert resp.headers["etag"] == etag
+        assert "immutable" in resp.headers["cache-control"]
+        assert "content-length" not in resp.headers
+        assert "content-type" not in resp.headers
+
+        resp = await client.get(url, headers={"If-Modified-Since": last_mod})
+        assert resp.status_code == 304
+
+        # The same instant as an asctime / "-0000" date parses naive; it must
+        # still compare against the aware Last-Modified rather than 500.
+        when = parsedate_to_datetime(last_mod)
+        naive = when.replace(tzinfo=None)
+        for ims in (naive.strftime("%a %b %d %H:%M:%S %Y"), format_datetime(naive)):
+            resp = await client.get(url, headers={"If-Modified-Since": ims})
+            assert resp.status_code == 304, ims
+        earlier = format_datetime(when - timedelta(seconds=1), usegmt=True)
+        resp = await client.get(url, headers={"If-Modified-Since": earlier})
+        assert resp.status_code == 200
+
+        # A stale ETag overrides a matching date and gets the full body.
+        resp = await client.get(
+            url, headers={"If-None-Match": '"stale"', "If-Modified-Since": last_mod}
+        )
+        assert resp.status_code == 200
+        assert resp.content == first.content
+
+
+async def test_file_range_edge_cases(client, seed, original):
+    seed("L1:a", path=str(original))
+    url = "/images/L1:a/file"
+    resp = await client.get(url, headers={"Range": "bytes=-3"})
+    assert resp.status_code == 206
+    assert resp.content == b"789"
+    resp = await client.get(url, headers={"Range": "bytes=7-"})
+    assert resp.content == b"789"
+    assert (await client.get(url, headers={"Range": "bytes=50-60"})).status_code == 416
+
+
+async def test_large_file_streams_intact_across_chunks(client, seed, tmp_path):
+    data = bytes(range(256)) * 10_000  # ~2.4 MiB: several 1 MiB reads
+    p = tmp_path / "big.png"
+    p.write_bytes(data)
+    seed("L1:a", path=str(p))
+    resp = await client.get("/images/L1:a/file")
+    assert resp.content == data
+    start = (1 << 20) - 5
+    resp = await client.get(
+        "/images/L1:a/file", headers={"Range": f"bytes={start}-{start + 9}"}
+    )
+    assert resp.content == data[start : start + 10]
+
+
+async def test_head_mirrors_get_headers_without_a_body(client, seed, original, thumb):
+    seed("L1:a", path=str(original), thumb_key=thumb)
+    for url in ("/images/L1:a/file", "/images/L1:a/thumb"):
+        get, head = await client.get(url), await client.head(url)
+        assert head.status_code == 200
+        assert head.content == b""
+        for h in ("etag", "last-modified", "content-length", "content-type"):
+            assert head.headers[h] == get.headers[h]
+
+    resp = await client.head("/images/L1:a/file", headers={"Range": "bytes=2-4"})
+    assert resp.status_code == 206
+    assert resp.headers["content-range"] == "bytes 2-4/10"
+    assert (await client.head("/images/L1:b/thumb")).status_code == 404
+
+
+async def test_file_body_uses_zero_copy_pathsend_when_server_offers_it(
+    client, seed, original
+):
+    # Servers advertising the ASGI `http.response.pathsend` extension (e.g.
+    # Granian) get the path and sendfile() it; the body never crosses Python.
+    from src.main import app
+
+    seed("L1:a", path=str(original))
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/images/L1:a/file",
+        "raw_path": b"/images/L1:a/file",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"test"), (b"accept-encoding", b"gzip")],
+        "client": ("127.0.0.1", 1),
+        "server": ("test", 80),
+        "extensions": {"http.response.pathsend": {}},
+    }
+    await app(scope, receive, send)
+    assert sent[0]["status"] == 200
+    assert sent[-1] == {"type": "http.response.pathsend", "path": str(original)}
@@ -78,6 +78,22 @@ async def test_reproject_writes_gen_columns_terms_and_prompt_tags(temp_db, seed)
     assert row.has_ai_tags is True
     assert row.has_prompt_tags is True
 
+    # Reprojecting an unchanged prompt leaves the tag array alone entirely.
+    tag_writes = []
+    engine = db.get_sync_engine()
+
+    def spy(conn, cursor, statement, *args):
+        if statement.startswith("UPDATE images SET has_tags"):
+            tag_writes.append(statement)
+
+    sa.event.listen(engine, "before_cursor_execute", spy)
+    try:
+        assert reproject.reproject_library("L1") == 1
+    finally:
+        sa.event.remove(engine, "before_cursor_execute", spy)
+    assert tag_writes == []
+    assert (await _img(image_id)).tags == row.tags
+
 
 async def test_reproject_model_filter_works_after_real_reprojection(client, seed):
     image_id = "L1:art.png"
@@ -101,6 +117,26 @@ async def test_reproject_model_filter_works_after_real_reprojection(client, seed
     assert [it["_id"] for it in resp.json()] == [image_id]
 
 
+async def test_rule_preview_matches_what_reprojection_writes(client, seed):
+    seed("L1:art.png")
+    with db.sync_tx() as conn:
+        conn.execute(
+            sa.insert(t.image_gen_raw).values(
+                _id="L1:art.png",
+                library_id="L1",
+                workflow_sig=None,
+                raw={"source": "a1111", "parameters": "a cat\nSteps: 20, Model: pony"},
+            )
+        )
+    resp = await client.post(
+        "/rules/preview", json={"sample_image_id": "L1:art.png", "fields": {}}
+    )
+    assert resp.status_code == 200, resp.text
+    assert resp.json()["gen"]["model"] == "pony"
+    missing = {"sample_image_id": "L1:none.png", "fields": {}}
+    assert (await client.post("/rules/preview", json=missing)).status_code == 404
+
+
 # --- full disk scan (sync, multithreaded) ------------------------------------
 
 
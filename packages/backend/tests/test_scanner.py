@@ -48,6 +48,21 @@ def test_read_gen_raw_none_when_no_metadata():
         assert scanner._read_gen_raw(im) is None
 
 
+def test_is_image_by_suffix_with_mimetypes_fallback():
+    assert scanner.is_image(Path("a/B.PNG"))
+    assert scanner.is_image(Path("scan.tiff"))  # not in IMAGE_EXTS; mimetypes knows it
+    assert not scanner.is_image(Path("notes.txt"))
+    assert not scanner.is_image(Path("noext"))
+
+
+def test_file_hash_is_sha1_of_contents(tmp_path):
+    import hashlib
+
+    p = tmp_path / "a.bin"
+    p.write_bytes(b"x" * 100_000)
+    assert scanner.file_hash(p) == hashlib.sha1(b"x" * 100_000).hexdigest()
+
+
 def test_image_id_for_is_library_prefixed_relative_path():
     root = Path("/data/lib")
     assert scanner.image_id_for("L1", root, root / "a" / "b.jpg") == "L1:a/b.jpg"
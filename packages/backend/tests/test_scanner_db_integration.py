@@ -66,6 +66,19 @@ async def test_upsert_refreshes_file_meta_but_preserves_tag_state(temp_db, seed)
     assert row.score == 4
 
 
+async def test_batch_upsert_is_one_executemany_with_the_same_rules(temp_db, seed):
+    seed("L1:x.jpg", tags=("cat",))
+    rows = [
+        scanner.image_upsert_values({"_id": i, "library_id": "L1", "path": f"/{i}"})
+        for i in ("L1:x.jpg", "L1:y.jpg")
+    ]
+    with db.sync_tx() as conn:
+        conn.execute(scanner._image_upsert_stmt(), rows)
+    x, y = await _img("L1:x.jpg"), await _img("L1:y.jpg")
+    assert (x.path, x.tags) == ("/L1:x.jpg", ["cat"])
+    assert (y.path, y.tags) == ("/L1:y.jpg", [])
+
+
 async def test_purge_cascades_tag_rows(client, seed):
     seed("L1:x.jpg", tags=("cat", "manual:fav"))
     # Sanity: join rows exist.
@@ -10,6 +10,8 @@ def test_expected_tables_exist():
         "images",
         "image_tags",
         "image_gen_terms",
+        "tag_counts",
+        "base_counts",
         "libraries",
         "image_gen_raw",
         "tag_meta",
@@ -40,10 +42,225 @@ def test_expected_indexes_present():
     names = {ix.name for tbl in schema.metadata.tables.values() for ix in tbl.indexes}
     assert {
         "ix_images_lib_id",
-        "ix_images_lib_has_ai_tags",
+        "ix_images_lib_no_ai_tags",
         "ix_images_gen_model",
-        "ix_image_tags_tag",
-        "ix_image_tags_base",
+        "ix_image_tags_tag_image",
+        "ix_image_tags_base_image",
         "ix_image_gen_terms_term",
         "ix_gen_raw_sig",
     } <= names
+
+
+def test_tag_indexes_cover_image_id():
+    # GROUP BY tag/base with MAX / COUNT(DISTINCT image_id) reads only the index.
+    ixs = {ix.name: ix for ix in schema.image_tags.indexes}
+    tag_ix, base_ix = ixs["ix_image_tags_tag_image"], ixs["ix_image_tags_base_image"]
+    assert [c.name for c in tag_ix.columns] == ["tag", "image_id"]
+    assert [c.name for c in base_ix.columns] == ["base", "image_id"]
+
+
+def test_flag_indexes_are_partial_on_the_false_rows():
+    from sqlalchemy.dialects import sqlite
+
+    ixs = {ix.name: ix for ix in schema.images.indexes}
+    for name, flag in (
+        ("ix_images_untagged", "has_tags"),
+        ("ix_images_lib_untagged", "has_tags"),
+        ("ix_images_no_ai_tags", "has_ai_tags"),
+        ("ix_images_lib_no_ai_tags", "has_ai_tags"),
+    ):
+        where = ixs[name].dialect_options["sqlite"]["where"]
+        assert str(where.compile(dialect=sqlite.dialect())) == f"images.{flag} IS 0"
+    assert not set(schema.RETIRED_INDEXES) & set(ixs)
+
+
+def test_slash_folded_id_lookup_is_covered_for_media_fields():
+    import sqlalchemy as sa
+
+    engine = sa.create_engine("sqlite://")
+    schema.metadata.create_all(engine)
+    img = schema.images.c
+    with engine.connect() as conn:
+        for field in (img.path, img.thumb_key):
+            stmt = sa.select(img._id, field).where(schema.ID_SLASH == "L1:a/b.png")
+            sql = str(stmt.compile(engine))
+            plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", ("L1:a/b.png",))
+            assert "COVERING INDEX ix_images_id_slash" in plan.fetchall()[0][-1]
+
+
+def test_ensure_schema_backfills_indexes_on_existing_tables(tmp_path):
+    import sqlalchemy as sa
+
+    from src.core.config import settings
+    from src.database import db
+
+    settings.sqlite_path = str(tmp_path / "old.db")
+    engine = sa.create_engine(f"sqlite:///{settings.sqlite_path}")
+    with engine.begin() as conn:
+        schema.images.create(conn)  # as an older release would have, then
+        conn.exec_driver_sql("DROP INDEX ix_images_id_slash")  # minus a new index
+    engine.dispose()
+
+    db._sync_engine = None
+    db.ensure_schema_sync()
+    with db.sync_conn() as conn:
+        names = set(
+            conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'index'"
+            ).scalars()
+        )
+    db.get_sync_engine().dispose()
+    db._sync_engine = None
+    assert "ix_images_id_slash" in names
+
+
+def test_ensure_schema_drops_retired_indexes(tmp_path):
+    import sqlalchemy as sa
+
+    from src.core.config import settings
+    from src.database import db
+
+    settings.sqlite_path = str(tmp_path / "old.db")
+    engine = sa.create_engine(f"sqlite:///{settings.sqlite_path}")
+    with engine.begin() as conn:
+        schema.images.create(conn)
+        conn.exec_driver_sql(
+            "CREATE INDEX ix_images_has_tags ON images (has_tags, _id DESC)"
+        )
+    engine.dispose()
+
+    db._sync_engine = None
+    db.ensure_schema_sync()
+    with db.sync_conn() as conn:
+        names = set(
+            conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'index'"
+            ).scalars()
+        )
+    db.get_sync_engine().dispose()
+    db._sync_engine = None
+    assert "ix_images_has_tags" not in names
+    assert "ix_images_untagged" in names
+
+
+def test_ensure_schema_upgrades_single_column_tag_indexes(tmp_path):
+    import sqlalchemy as sa
+
+    from src.core.config import settings
+    from src.database import db
+
+    settings.sqlite_path = str(tmp_path / "old.db")
+    engine = sa.create_engine(f"sqlite:///{settings.sqlite_path}")
+    with engine.begin() as conn:
+        # image_tags as an earlier release left it: single-column tag indexes.
+        schema.image_tags.create(conn)
+        conn.exec_driver_sql("DROP INDEX ix_image_tags_tag_image")
+        conn.exec_driver_sql("DROP INDEX ix_image_tags_base_image")
+        conn.exec_driver_sql("CREATE INDEX ix_image_tags_tag ON image_tags (tag)")
+        conn.exec_driver_sql("CREATE INDEX ix_image_tags_base ON image_tags (base)")
+    engine.dispose()
+
+    db._sync_engine = None
+    db.ensure_schema_sync()
+    with db.sync_conn() as conn:
+        names = set(
+            conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'index'"
+            ).scalars()
+        )
+        plan = [
+            r[-1]
+            for r in conn.exec_driver_sql(
+                "EXPLAIN QUERY PLAN SELECT tag, MAX(image_id) FROM image_tags "
+                "GROUP BY tag"
+            )
+        ]
+    db.get_sync_engine().dispose()
+    db._sync_engine = None
+    assert not {"ix_image_tags_tag", "ix_image_tags_base"} & names
+    assert {"ix_image_tags_tag_image", "ix_image_tags_base_image"} <= names
+    assert "COVERING INDEX ix_image_tags_tag_image" in plan[0]
+
+
+def test_feed_branches_walk_their_compound_index():
+    # Each feed filter shape must seek its `(..., _id desc)` index so LIMIT stops
+    # after a page, instead of scanning and sorting the whole table.
+    import sqlalchemy as sa
+
+    from src.services.image_feed import FEED_COLUMNS, FeedFilter, feed_where
+
+    engine = sa.create_engine("sqlite://")
+    schema.metadata.create_all(engine)
+    cases = {
+        "sqlite_autoindex_images_1": FeedFilter(),
+        "ix_images_lib_id": FeedFilter(library_id="L1"),
+        "ix_images_untagged": FeedFilter(no_tags=1),
+        "ix_images_no_ai_tags": FeedFilter(no_ai_tags=1),
+        "ix_images_lib_untagged": FeedFilter(library_id="L1", no_tags=1),
+        "ix_images_lib_no_ai_tags": FeedFilter(library_id="L1", no_ai_tags=1),
+        "ix_images_gen_model": FeedFilter(model=["m"]),
+    }
+    with engine.connect() as conn:
+        for index, f in cases.items():
+            stmt = (
+                sa.select(*FEED_COLUMNS)
+                .where(feed_where(f), schema.images.c._id < "z")
+                .order_by(schema.images.c._id.desc())
+                .limit(50)
+            )
+            sql = str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+            plan = [r[-1] for r in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+            assert f"USING INDEX {index} " in plan[0], (f, plan)
+            assert not any("TEMP B-TREE" in step for step in plan), (f, plan)
+
+
+def test_merged_tag_counts_read_presorted_from_index():
+    import sqlalchemy as sa
+
+    engine = sa.create_engine("sqlite://")
+    schema.metadata.create_all(engine)
+    bc = schema.base_counts.c
+    stmt = sa.select(bc.base, bc.count).order_by(bc.count.desc())
+    with engine.connect() as conn:
+        plan = [r[-1] for r in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {stmt}")]
+    assert plan == ["SCAN base_counts USING COVERING INDEX ix_base_counts_count"]
+
+
+def test_library_scoped_gen_raw_reads_seek_the_compound_index():
+    import sqlalchemy as sa
+    from sqlalchemy.dialects import sqlite
+
+    engine = sa.create_engine("sqlite://")
+    schema.metadata.create_all(engine)
+    raw = schema.image_gen_raw.c
+    assert "ix_gen_raw_lib" not in {ix.name for ix in schema.image_gen_raw.indexes}
+    for stmt in (
+        sa.select(raw._id, raw.raw).where(raw.library_id == "L1"),
+        sa.delete(schema.image_gen_raw).where(raw.library_id == "L1"),
+    ):
+        sql = str(
+            stmt.compile(
+                dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}
+            )
+        )
+        with engine.connect() as conn:
+            plan = " ".join(
+                r[-1] for r in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")
+            )
+        assert "USING INDEX ix_gen_raw_lib_sig (library_id=?)" in plan, plan
+
+
+def test_warm_sync_pool_leaves_every_pool_connection_open(tmp_path):
+    from src.core.config import settings
+    from src.database import db
+
+    settings.sqlite_path = str(tmp_path / "warm.db")
+    db._sync_engine = None
+    try:
+        db.warm_sync_pool()
+        pool = db.get_sync_engine().pool
+        assert pool.size() > 1
+        assert (pool.checkedin(), pool.checkedout()) == (pool.size(), 0)
+    finally:
+        db.get_sync_engine().dispose()
+        db._sync_engine = None
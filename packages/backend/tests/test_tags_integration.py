@@ -2,11 +2,14 @@
 including the tag-state invariant (array + flags + derived join rows stay in sync).
 """
 
+import asyncio
+
 import pytest
 import sqlalchemy as sa
 
 from src.database import db
 from src.database import schema as t
+from src.services import image_tags
 
 pytestmark = pytest.mark.asyncio
 
@@ -40,6 +43,16 @@ async def test_tag_cloud_default_is_ai_only(client, seed):
     assert by_tag == {"cat": 2}  # manual:/prompt: excluded by default
 
 
+async def test_tag_cloud_prefix_exclusion_keeps_neighbouring_tags(client, seed):
+    # Tags sorting right next to the hidden `manual:`/`prompt:` spans stay in.
+    seed("L1:a", tags=("manual", "manual;x", "mz", "prompt", "prompts", "manual:f"))
+    seed("L1:b", tags=("prompt:x", "zz"))
+    by_tag = {r["_id"] for r in (await client.get("/tags")).json()}
+    assert by_tag == {"manual", "manual;x", "mz", "prompt", "prompts", "zz"}
+    resp = await client.get("/tags", params={"include_prompt": True})
+    assert {r["_id"] for r in resp.json()} == by_tag | {"prompt:x"}
+
+
 async def test_tag_cloud_opts_into_manual_and_prompt(client, seed):
     seed("L1:a", tags=("cat", "manual:fav", "prompt:m"))
     resp = await client.get(
@@ -49,6 +62,24 @@ async def test_tag_cloud_opts_into_manual_and_prompt(client, seed):
     assert by_tag == {"cat": 1, "manual:fav": 1, "prompt:m": 1}
 
 
+async def test_tag_cloud_orders_by_count_for_every_kind_mix(client, seed):
+    seed("L1:a", tags=("a", "b", "manual:m", "prompt:p", "z"))
+    seed("L1:b", tags=("b", "manual:m", "prompt:p", "z"))
+    seed("L1:c", tags=("b", "prompt:p"))
+    for params, want in (
+        ({}, {"b": 3, "z": 2, "a": 1}),
+        ({"include_manual": True}, {"b": 3, "manual:m": 2, "z": 2, "a": 1}),
+        (
+            {"include_manual": True, "include_prompt": True},
+            {"b": 3, "prompt:p": 3, "manual:m": 2, "z": 2, "a": 1},
+        ),
+    ):
+        rows = (await client.get("/tags", params=params)).json()
+        counts = [r["count"] for r in rows]
+        assert counts == sorted(counts, reverse=True), params
+        assert {r["_id"]: r["count"] for r in rows} == want
+
+
 async def test_merge_sources_counts_distinct_images_once(client, seed):
     # An image carrying both manual:cat and prompt:cat must count once for "cat".
     seed("L1:a", tags=("manual:cat", "prompt:cat"))
@@ -100,3 +131,199 @@ async def test_tag_filter_reflects_mutation_end_to_end(client, seed):
     # The manual tag is now queryable via the any: fan-out.
     resp = await client.get("/images", params={"tags": "any:fav"})
     assert [it["_id"] for it in resp.json()] == ["L1:a"]
+
+
+async def test_clear_ai_tags_skips_rows_never_ai_tagged(client, seed):
+    seed("L1:a", tags=("1girl",), rating="general")
+    seed("L1:b", tags=("manual:fav",), rating="sensitive")
+    resp = await client.post("/ai/clear-ai-tags")
+    assert resp.json() == {"matched": 1, "modified": 1}
+
+    # Untouched: no AI tags and no AI metadata, so its rating stays.
+    assert (await _row("L1:b")).rating == "sensitive"
+    # A second pass has nothing left to clear (a cleared `ai` is JSON null).
+    resp = await client.post("/ai/clear-ai-tags")
+    assert resp.json() == {"matched": 0, "modified": 0}
+
+
+async def test_tag_cloud_cache_sees_writes_from_outside_the_router(client, seed):
+    seed("L1:a", tags=("cat",))
+    assert [r["_id"] for r in (await client.get("/tags")).json()] == ["cat"]
+    # The AI job path writes through the service, never touching tags.py — the
+    # shared version bump must still invalidate the cached listing.
+    await image_tags.replace_ai("L1:a", ai_tags=["dog"], ai_meta={}, rating="general")
+    assert [r["_id"] for r in (await client.get("/tags")).json()] == ["dog"]
+
+
+async def test_tag_counts_track_writes_and_cascading_deletes(client, seed):
+    seed("L1:a", tags=("cat", "manual:cat"))
+    seed("L2:b", library_id="L2", tags=("cat", "prompt:cat", "dog"))
+    await image_tags.remove_tags("L1:a", ["cat"])
+    await client.post("/tags/apply/L1:a", json=["dog"])
+
+    async def counts(**params):
+        resp = await client.get("/tags", params=params)
+        return {r["_id"]: r["count"] for r in resp.json()}
+
+    assert await counts(include_manual=True, include_prompt=True) == {
+        "cat": 1,
+        "dog": 1,
+        "manual:cat": 1,
+        "manual:dog": 1,
+        "prompt:cat": 1,
+    }
+    assert await counts(merge_sources=True) == {"any:cat": 2, "any:dog": 2}
+
+    # Deleting a library cascades its join rows away; the counters follow.
+    await client.delete("/libraries/L2")
+    assert await counts(merge_sources=True) == {"any:cat": 1, "any:dog": 1}
+    assert await counts() == {}
+
+
+async def test_tag_cloud_thumb_is_pinned_else_newest(client, seed):
+    seed("L1:a", tags=("cat",))
+    seed("L1:b", tags=("cat",))
+    (cat,) = (await client.get("/tags")).json()
+    assert cat["thumb_image_id"] == "L1:b"
+    await client.post("/tags/thumbnail/cat", json={"image_id": "L1:a"})
+    (cat,) = (await client.get("/tags")).json()
+    assert cat["thumb_image_id"] == "L1:a"
+
+
+async def test_removing_an_absent_tag_writes_nothing(client, seed):
+    seed("L1:a", tags=("cat", "manual:fav"))
+    before = await image_tags.tags_version()
+    await client.post("/tags/remove/L1:a", json=["dog"])
+    assert await image_tags.tags_version() == before
+    await client.post("/tags/remove/L1:a", json=["cat"])
+    assert await image_tags.tags_version() == before + 1
+    assert await _tag_rows("L1:a") == {"manual:fav"}
+
+
+async def test_tag_cloud_is_served_from_cache_until_the_version_moves(client, seed):
+    seed("L1:a", tags=("cat",))
+    seed("L1:b", tags=("cat",))
+    assert (await client.get("/tags")).json()[0]["count"] == 2
+    # A raw counter edit that skips the version bump stays invisible: the
+    # listing is a cache hit, with no TTL to expire it.
+    async with db.async_tx() as conn:
+        await conn.execute(sa.update(t.tag_counts).values(count=7))
+    assert (await client.get("/tags")).json()[0]["count"] == 2
+    # Cascading deletes bump the version like any other tag write.
+    await client.post("/images/L1:b/purge", json={"confirm": True})
+    assert (await client.get("/tags")).json()[0]["count"] == 6
+
+
+async def test_replace_ai_many_writes_a_batch_with_one_version_bump(client, seed):
+    seed("L1:a", tags=("old", "manual:fav"))
+    seed("L1:sub\\b", tags=())
+    before = await image_tags.tags_version()
+    written = await image_tags.replace_ai_many(
+        [
+            ("L1:a", ["cat"], {"model_repo": "m"}, "general"),
+            ("L1:sub/b", ["dog"], {}, "sensitive"),  # slash variant resolves
+            ("L1:ghost", ["x"], {}, "general"),  # unknown: skipped
+            ("L1:a", ["cat", "ear"], {}, "general"),  # repeat diffs the first
+        ]
+    )
+    assert written == 3
+    assert await image_tags.tags_version() == before + 1
+    assert await _tag_rows("L1:a") == {"cat", "ear", "manual:fav"}
+    assert await _tag_rows("L1:sub\\b") == {"dog"}
+    row = await _row("L1:sub\\b")
+    assert (row.rating, row.has_ai_tags) == ("sensitive", True)
+
+
+async def test_concurrent_tag_cloud_misses_share_one_build(client, seed, monkeypatch):
+    from src.api import tags as tags_api
+
+    seed("L1:a", tags=("cat",))
+    builds = 0
+    real = tags_api._build_tag_list
+
+    async def counting(*args):
+        nonlocal builds
+        builds += 1
+        await asyncio.sleep(0.05)  # a slow build: the other misses pile up
+        return await real(*args)
+
+    monkeypatch.setattr(tags_api, "_build_tag_list", counting)
+    resps = await asyncio.gather(*(client.get("/tags") for _ in range(8)))
+    assert builds == 1
+    assert {r.text for r in resps} == {
+        '[{"_id":"cat","count":1,"thumb_image_id":"L1:a"}]'
+    }
+
+
+async def test_tag_samples_pick_distinct_tagged_images_pinned_first(client, seed):
+    for i in range(6):
+        seed(f"L1:{i}", tags=("cat",))
+    seed("L1:dog", tags=("dog",))
+    await client.post("/tags/thumbnail/cat", json={"image_id": "L1:3"})
+    resp = await client.get("/tags/samples", params={"tags": ["cat", "dog"], "per": 4})
+    by_tag = {tag: [s["_id"] for s in samples] for tag, samples in resp.json().items()}
+    assert by_tag["dog"] == ["L1:dog"]
+    cat = by_tag["cat"]
+    assert cat[0] == "L1:3" and len(set(cat)) == 4
+    assert set(cat) <= {f"L1:{i}" for i in range(6)}
+
+
+async def test_large_tag_cloud_is_served_pre_gzipped(client, seed):
+    seed("L1:a", tags=tuple(f"tag_{i:03d}" for i in range(60)))
+    plain = await client.get("/tags", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert len(plain.json()) == 60
+    for _ in range(2):  # the build, then a cache hit
+        resp = await client.get("/tags", headers={"Accept-Encoding": "gzip"})
+        assert resp.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in resp.headers["vary"]
+        assert resp.content == plain.content  # httpx decoded it
+    assert "Accept-Encoding" in plain.headers["vary"]
+
+
+async def test_tag_cloud_gzip_respects_accept_encoding_q_values(client, seed):
+    seed("L1:a", tags=tuple(f"tag_{i:03d}" for i in range(60)))
+    for accept, gzipped in [
+        ("gzip;q=0, identity", False),
+        ("br, *;q=0", False),
+        ("x-gzip-ish", False),
+        ("br, *", True),
+        ("identity;q=0.5, GZIP;q=0.8", True),
+        ("gzip;q=0, *", False),  # the explicit entry wins over the wildcard
+    ]:
+        resp = await client.get("/tags", headers={"Accept-Encoding": accept})
+        encoding = resp.headers.get("content-encoding")
+        assert encoding == ("gzip" if gzipped else None), accept
+        assert "Accept-Encoding" in resp.headers["vary"]
+        assert len(resp.json()) == 60
+
+
+async def test_tag_cloud_revalidates_to_304_until_a_tag_write(client, seed):
+    seed("L1:a", tags=("cat",))
+    first = await client.get("/tags")
+    etag = first.headers["etag"]
+    again = await client.get("/tags", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+    assert again.headers["etag"] == etag
+    await client.post("/tags/apply/L1:a", json=["fav"])
+    fresh = await client.get("/tags", headers={"If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.headers["etag"] != etag
+
+
+async def test_tag_cloud_etag_does_not_survive_a_recreated_db(client, seed, tmp_path):
+    from src.api.tags import invalidate_tag_caches
+    from src.core.config import settings
+
+    seed("L1:a", tags=("cat",))
+    etag = (await client.get("/tags")).headers["etag"]
+    # A fresh file at the same version, as after deleting the DB.
+    settings.sqlite_path = str(tmp_path / "recreated.db")
+    await db.reset_engines()
+    await db.ensure_schema()
+    invalidate_tag_caches()
+    seed("L1:a", tags=("dog",))
+    resp = await client.get("/tags", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert [r["_id"] for r in resp.json()] == ["dog"]
+    assert resp.headers["etag"].rsplit("-", 1)[1] == etag.rsplit("-", 1)[1]
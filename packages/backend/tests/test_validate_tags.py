@@ -0,0 +1,87 @@
+"""Unit tests for the shared route helpers: the tag-body validator used by the
+tag routes, the image-id URL quoting used for thumb URLs and the
+Accept-Encoding check behind gzip responses."""
+
+from urllib.parse import quote
+
+import pytest
+from fastapi import HTTPException
+
+from src.api import _utils
+from src.api._utils import accepts_gzip, quote_id, validate_tags
+
+
+def test_strips_and_preserves_order():
+    assert validate_tags([" cat ", "dog"]) == ["cat", "dog"]
+
+
+def test_empty_list_is_valid():
+    assert validate_tags([]) == []
+
+
+@pytest.mark.parametrize(
+    "tags, detail",
+    [
+        (["ok", "  "], "tags must be non-empty"),
+        (["ok", None], "tags must be non-empty"),
+        (["x" * 129], "tag too long (max 128)"),
+        (["t"] * 101, "too many tags (max 100)"),
+    ],
+)
+def test_rejects_invalid(tags, detail):
+    with pytest.raises(HTTPException) as exc:
+        validate_tags(tags)
+    assert exc.value.status_code == 422
+    assert exc.value.detail == detail
+
+
+def test_length_limit_applies_after_strip():
+    assert validate_tags(["  " + "x" * 128 + "  "]) == ["x" * 128]
+
+
+def test_repeat_tags_share_one_validated_object():
+    first = validate_tags([" cat ", "dog"])
+    again = validate_tags([" cat ", "cat", "dog"])
+    assert again == ["cat", "cat", "dog"]
+    assert again[0] is again[1] is first[0]
+    # A remembered tag still can't smuggle an invalid one past validation.
+    with pytest.raises(HTTPException):
+        validate_tags(["cat", "  "])
+
+
+def test_known_tag_cache_stays_bounded():
+    for i in range(10_000):
+        validate_tags([f"  tag{i}  ", f"tag{i}"])
+    assert len(_utils._KNOWN_TAGS) <= _utils._KNOWN_TAGS_MAX
+    assert "  tag9999  " not in _utils._KNOWN_TAGS  # raw spellings aren't keys
+
+
+@pytest.mark.parametrize(
+    "image_id",
+    [
+        "L1:sub dir/a_b-c.~1.png",
+        "L1:a\\b%20#?&+",
+        "L1:ünï/ça.png",
+        "".join(map(chr, range(128))),
+    ],
+)
+def test_quote_id_matches_urllib(image_id):
+    assert quote_id(image_id) == quote(image_id, safe="")
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("gzip, deflate, br", True),
+        ("br;q=1.0, gzip;q=0.5", True),
+        ("*", True),
+        ("gzip;q=0", False),
+        ("gzip; q=0.000, *", False),
+        ("*;q=0", False),
+        ("identity", False),
+        ("x-gzipped", False),
+        ("", False),
+    ],
+)
+def test_accepts_gzip_reads_tokens_and_q_values(header, expected):
+    assert accepts_gzip(header) is expected
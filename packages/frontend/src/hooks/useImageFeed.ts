@@ -43,8 +43,9 @@ export function useImageFeed(filters: Filters, limit: number = PAGE_LIMIT) {
 }
 
 /**
- * The grouped (batch-collapsed) view of the feed. Offset-paged; each item is a
- * batch representative carrying `group_count`. Same filter shape as the feed.
+ * The grouped (batch-collapsed) view of the feed. Cursor-paged on the
+ * representative's id; each item is a batch representative carrying
+ * `group_count`. Same filter shape as the feed.
  */
 export function useImageGroups(
   filters: Filters,
@@ -55,10 +56,10 @@ export function useImageGroups(
     queryKey: ["image-groups", limit, filters] as const,
     enabled,
     queryFn: ({ pageParam, signal }) =>
-      fetchGroupsPage(filters, { offset: pageParam, limit, signal }),
-    initialPageParam: 0,
-    getNextPageParam: (lastPage: ImageDoc[], allPages) =>
-      lastPage.length >= limit ? allPages.length * limit : undefined,
+      fetchGroupsPage(filters, { cursor: pageParam, limit, signal }),
+    initialPageParam: null as string | null,
+    getNextPageParam: (lastPage: ImageDoc[]) =>
+      lastPage.length >= limit ? nextCursorOf(lastPage) : undefined,
   });
 
   const items = useMemo<ImageDoc[]>(
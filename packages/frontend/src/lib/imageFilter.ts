@@ -174,16 +174,14 @@ export async function fetchImagesPage(
   return (await r.json()) as ImageDoc[];
 }
 
-/** Fetch one page of the grouped (batch-collapsed) view. Offset-paged because
- * grouping is a server-side aggregation, not cursor-pageable. */
+/** Fetch one page of the grouped (batch-collapsed) view. Cursor-paged like the
+ * feed: each group appears once, keyed by its representative's id. */
 export async function fetchGroupsPage(
   filters: Filters,
-  opts: { offset?: number; limit?: number; signal?: AbortSignal } = {},
+  opts: { cursor?: string | null; limit?: number; signal?: AbortSignal } = {},
 ): Promise<ImageDoc[]> {
-  const sp = serializeFilters(filters);
-  sp.set("limit", String(opts.limit ?? PAGE_LIMIT));
-  sp.set("offset", String(opts.offset ?? 0));
-  const r = await fetch(`/api/images/groups?${sp.toString()}`, {
+  const qs = buildImagesQuery(filters, opts);
+  const r = await fetch(`/api/images/groups?${qs}`, {
     signal: opts.signal,
   });
   if (!r.ok) throw new Error(await r.text());
@@ -5,13 +5,16 @@ import { isActiveJob, type AiJobError } from "../../../lib/ai";
 import { useSettings } from "../SettingsContext";
 
 /** Expandable per-job failure list. The backend records one entry per image
- * that threw during tagging ({@link AiJobError}); the status poll already
- * carries these, so this is purely a disclosure over data we have. */
-function JobErrors({ errors }: { errors: AiJobError[] }) {
+ * that threw during tagging ({@link AiJobError}), up to a cap — `failed` is
+ * the full count; the status poll already carries both, so this is purely a
+ * disclosure over data we have. */
+function JobErrors({ errors, failed }: { errors: AiJobError[]; failed: number }) {
+  const count = Math.max(failed, errors.length);
   return (
     <details className="text-xs">
       <summary className="cursor-pointer text-red-300 hover:text-red-200">
-        {errors.length} {errors.length === 1 ? "error" : "errors"}
+        {count} {count === 1 ? "error" : "errors"}
+        {count > errors.length && ` (first ${errors.length} shown)`}
       </summary>
       <div className="mt-1 max-h-40 overflow-auto space-y-1 rounded border border-red-900/50 bg-red-950/20 p-2">
         {errors.map((e, i) => (
@@ -117,7 +120,7 @@ export function JobsSection() {
             )}
 
             {latestJob.errors && latestJob.errors.length > 0 && (
-              <JobErrors errors={latestJob.errors} />
+              <JobErrors errors={latestJob.errors} failed={latestJob.failed} />
             )}
           </div>
         )}
@@ -168,7 +171,7 @@ export function JobsSection() {
                 </div>
               </div>
               {j.errors && j.errors.length > 0 && (
-                <JobErrors errors={j.errors} />
+                <JobErrors errors={j.errors} failed={j.failed} />
               )}
             </div>
           ))}